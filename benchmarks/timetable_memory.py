@@ -0,0 +1,105 @@
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from domain.timetable_parser import get_all_timetables_from_file  # noqa: E402
+from domain.timetable_snapshot import TimetableSnapshot  # noqa: E402
+
+WEEKDAYS = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота"]
+TIMES = [
+    "8:30-10:00",
+    "10:10-11:40",
+    "11:50-13:20",
+    "14:00-15:30",
+    "15:40-17:10",
+    "17:50-19:20",
+    "19:30-21:00",
+]
+STREAM_SIZE = 10  # Groups that attend the same lectures
+
+
+def make_workbook(filename: str, sheets: int, groups_per_sheet: int):
+    import openpyxl
+
+    rnd = random.Random(42)
+    teachers = [f"Преподаватель {i} И.О." for i in range(60)]
+    courses = [f"Дисциплина номер {i}" for i in range(80)]
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for sheet in range(sheets):
+        ws = workbook.create_sheet(f"{sheet + 1} курс")
+        for day, weekday in enumerate(WEEKDAYS):
+            ws.cell(3 + day * 7, 1, "\n".join(weekday.upper()))
+            for slot, time in enumerate(TIMES):
+                ws.cell(3 + day * 7 + slot, 2, time)
+        for group in range(groups_per_sheet):
+            ws.cell(2, 3 + group, f"{sheet + 1:02}-{100 + group}")
+        for row in range(3, 45):
+            for stream in range(0, groups_per_sheet, STREAM_SIZE):
+                first = 3 + stream
+                last = min(first + STREAM_SIZE, 3 + groups_per_sheet) - 1
+                kind = rnd.random()
+                if kind < 0.3:
+                    continue  # No lessons
+                if kind < 0.6:
+                    ws.cell(
+                        row,
+                        first,
+                        f"{rnd.choice(courses)} (лекция)\n"
+                        f"{rnd.choice(teachers)}\n"
+                        f"ауд. {rnd.randint(100, 1400)}",
+                    )
+                    ws.merge_cells(
+                        start_row=row,
+                        start_column=first,
+                        end_row=row,
+                        end_column=last,
+                    )
+                    continue
+                for col in range(first, last + 1):
+                    if rnd.random() < 0.8:
+                        ws.cell(
+                            row,
+                            col,
+                            f"{rnd.choice(courses)} (практика)\n"
+                            f"{rnd.choice(teachers)}\n"
+                            f"ауд. {rnd.randint(100, 1400)}",
+                        )
+    workbook.save(filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Memory taken by parsed timetables of all groups."
+    )
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--groups-per-sheet", type=int, default=95)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "timetable.xlsx")
+        make_workbook(filename, args.sheets, args.groups_per_sheet)
+        import openpyxl  # noqa: F401 Keep module import out of the trace
+
+        gc.collect()
+        tracemalloc.start()
+        snapshot = TimetableSnapshot(get_all_timetables_from_file(filename))
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    groups = len(snapshot.index)
+    print(f"Groups:          {groups}")
+    print(f"Retained:        {current} B")
+    print(f"Retained/group:  {current / groups:.0f} B")
+    print(f"Peak (parsing):  {peak} B")
+
+
+if __name__ == "__main__":
+    main()
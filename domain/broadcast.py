@@ -0,0 +1,59 @@
+class Broadcast:
+    def __init__(self, id: int, text: str):
+        self.__id = id
+        self.__text = text
+        self.__last_user_id = 0
+        self.__sent = 0
+        self.__failed = 0
+        self.__removed = 0
+        self.__finished = False
+
+    @property
+    def id(self) -> int:
+        return self.__id
+
+    @property
+    def text(self) -> str:
+        return self.__text
+
+    @property
+    def last_user_id(self) -> int:
+        # Users are messaged in the order of their ids, so everyone up to
+        # this id has already been handled
+        return self.__last_user_id
+
+    @last_user_id.setter
+    def last_user_id(self, user_id: int):
+        self.__last_user_id = user_id
+
+    @property
+    def sent(self) -> int:
+        return self.__sent
+
+    @sent.setter
+    def sent(self, count: int):
+        self.__sent = count
+
+    @property
+    def failed(self) -> int:
+        return self.__failed
+
+    @failed.setter
+    def failed(self, count: int):
+        self.__failed = count
+
+    @property
+    def removed(self) -> int:
+        return self.__removed
+
+    @removed.setter
+    def removed(self, count: int):
+        self.__removed = count
+
+    @property
+    def finished(self) -> bool:
+        return self.__finished
+
+    @finished.setter
+    def finished(self, finished: bool):
+        self.__finished = finished
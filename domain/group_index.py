@@ -0,0 +1,96 @@
+from typing import Dict, Iterable, List, Set, Tuple
+import re
+
+# Cyrillic letters that look like Latin ones, in either case
+LOOKALIKES = str.maketrans(
+    {
+        "а": "a",
+        "в": "b",
+        "е": "e",
+        "ё": "e",
+        "к": "k",
+        "м": "m",
+        "н": "h",
+        "о": "o",
+        "р": "p",
+        "с": "c",
+        "т": "t",
+        "у": "y",
+        "х": "x",
+    }
+)
+DASHES = re.compile(r"[‐-―−­_]")
+SPACES = re.compile(r"\s+")
+
+
+def normalize_group_name(name: str) -> str:
+    name = DASHES.sub("-", name.casefold())
+    name = SPACES.sub("", name)
+    return name.translate(LOOKALIKES)
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class GroupLocation:
+    def __init__(self, name: str, sheet: int, column: int):
+        self.__name = name
+        self.__sheet = sheet
+        self.__column = column
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def sheet(self) -> int:
+        return self.__sheet
+
+    @property
+    def column(self) -> int:
+        return self.__column
+
+
+class GroupIndex:
+    def __init__(self, locations: Iterable[GroupLocation]):
+        self.__by_key: Dict[str, GroupLocation] = {}
+        self.__trigrams: Dict[str, List[int]] = {}
+        self.__sizes: List[int] = []
+        self.__names: List[str] = []
+        for location in locations:
+            key = normalize_group_name(location.name)
+            if not key or key in self.__by_key:
+                continue  # First column with the same name wins
+            self.__by_key[key] = location
+            grams = trigrams(key)
+            for gram in grams:
+                self.__trigrams.setdefault(gram, []).append(len(self.__names))
+            self.__sizes.append(len(grams))
+            self.__names.append(location.name)
+
+    def __len__(self) -> int:
+        return len(self.__names)
+
+    @property
+    def names(self) -> List[str]:
+        return self.__names
+
+    def get(self, name: str) -> GroupLocation | None:
+        return self.__by_key.get(normalize_group_name(name))
+
+    def suggest(self, name: str, limit: int = 3) -> List[str]:
+        grams = trigrams(normalize_group_name(name))
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for i in self.__trigrams.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        # Dice coefficient over trigram sets
+        scored: List[Tuple[float, int]] = sorted(
+            (
+                (-2 * count / (len(grams) + self.__sizes[i]), i)
+                for i, count in shared.items()
+            )
+        )
+        return [self.__names[i] for _, i in scored[:limit]]
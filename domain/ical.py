@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta
+from domain.timetable_parser import Timetable
+from typing import Iterator, List, Tuple
+import re
+
+# Times in the sheet are local, calendars get them in UTC
+LOCAL_OFFSET = timedelta(hours=3)
+TIME_RANGE = re.compile(r"(\d{1,2})[:.](\d{2})\s*[-–—]\s*(\d{1,2})[:.](\d{2})")
+
+
+def parse_time_range(text: str | None) -> Tuple[timedelta, timedelta] | None:
+    match = TIME_RANGE.search(text or "")
+    if match is None:
+        return None
+    h1, m1, h2, m2 = map(int, match.groups())
+    return timedelta(hours=h1, minutes=m1), timedelta(hours=h2, minutes=m2)
+
+
+def escape_text(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def fold_line(line: str) -> Iterator[str]:
+    # Content lines are at most 75 octets, continued lines start with
+    # a space
+    data = line.encode("utf-8")
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        while data[cut] & 0xC0 == 0x80:  # Do not split a character
+            cut -= 1
+        yield data[:cut].decode("utf-8")
+        data = b" " + data[cut:]
+    yield data.decode("utf-8")
+
+
+def format_utc(local: datetime) -> str:
+    return (local - LOCAL_OFFSET).strftime("%Y%m%dT%H%M%SZ")
+
+
+def timetable_to_ical(
+    group: str, timetable: Timetable, start: date, weeks: int
+) -> bytes:
+    # The sheet describes one week, so every lesson is a weekly event
+    # repeated until the end of the semester. The output depends only on
+    # the arguments, so that it can be cached.
+    first_monday = start - timedelta(days=start.weekday())
+    stamp = format_utc(datetime.combine(start, datetime.min.time()))
+    lines: List[str] = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//tttbot//timetable//RU",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{escape_text(f'Расписание {group}')}",
+    ]
+    for day_index, weekday in enumerate(timetable.timetable[:7]):
+        day = first_monday + timedelta(days=day_index)
+        count = weeks
+        if day < start:
+            # The semester starts in the middle of the first week
+            day += timedelta(days=7)
+            count -= 1
+        day_start = datetime.combine(day, datetime.min.time())
+        for row_index, row in enumerate(weekday.timetable):
+            times = parse_time_range(row.time)
+            if not row.lessons or times is None or count < 1:
+                continue
+            lesson_start, lesson_end = times
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:{group}-{first_monday:%Y%m%d}-{day_index}-{row_index}"
+                "@tttbot",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART:{format_utc(day_start + lesson_start)}",
+                f"DTEND:{format_utc(day_start + lesson_end)}",
+                f"RRULE:FREQ=WEEKLY;COUNT={count}",
+                f"SUMMARY:{escape_text(row.lessons.splitlines()[0])}",
+                f"DESCRIPTION:{escape_text(row.lessons)}",
+                "END:VEVENT",
+            ]
+    lines.append("END:VCALENDAR")
+    return "".join(
+        folded + "\r\n" for line in lines for folded in fold_line(line)
+    ).encode("utf-8")
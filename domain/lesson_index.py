@@ -0,0 +1,164 @@
+from bisect import bisect_left
+from domain.group_index import GroupLocation
+from domain.timetable_parser import Timetable
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+import re
+
+WORD = re.compile(r"\w+")
+# Noun, adjective and surname endings, longest first. Stripping them and
+# matching the rest as a prefix finds most forms of a word: "Иванова" and
+# "Иванову" both become "иванов", "математике" matches "математика".
+ENDINGS = sorted(
+    (
+        "ами ями ого его ому ему ыми ими иям иях ией ой ей ий ый ая яя ое ее "
+        "ом ем ам ям ах ях ию ия ие ью а я о е ы и у ю ь й"
+    ).split(),
+    key=len,
+    reverse=True,
+)
+MIN_STEM_LEN = 3
+
+
+def normalize_word(word: str) -> str:
+    return word.casefold().replace("ё", "е")
+
+
+def stem(word: str) -> str:
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LEN:
+            return word[: -len(ending)]
+    return word
+
+
+def words(text: str) -> List[str]:
+    return [normalize_word(w) for w in WORD.findall(text)]
+
+
+def is_search_word(word: str) -> bool:
+    # Single letters, e.g. initials, would match almost everything, but
+    # single digits, e.g. rooms or lesson numbers, match exactly
+    return len(word) > 1 or word.isdigit()
+
+
+class LessonHit:
+    __slots__ = (
+        "day_index",
+        "row_index",
+        "weekday",
+        "time",
+        "lessons",
+        "groups",
+    )
+
+    def __init__(
+        self,
+        day_index: int,
+        row_index: int,
+        weekday: str,
+        time: str,
+        lessons: str,
+        groups: List[str] | None = None,
+    ):
+        self.day_index = day_index
+        self.row_index = row_index
+        self.weekday = weekday
+        self.time = time
+        self.lessons = lessons
+        # Lectures are shared by several groups
+        self.groups: List[str] = groups if groups is not None else []
+
+
+def build_lesson_index(
+    timetables: Iterable[Tuple[GroupLocation, Timetable]],
+) -> "LessonIndex":
+    hits: List[LessonHit] = []
+    by_cell: Dict[Tuple[int, str, str], int] = {}
+    postings: Dict[str, Set[int]] = {}
+    for location, tt in timetables:
+        for day_index, day in enumerate(tt.timetable):
+            for row_index, row in enumerate(day.timetable):
+                if not row.lessons:
+                    continue
+                cell = (day_index, row.time, row.lessons)
+                hit_id = by_cell.get(cell)
+                if hit_id is None:
+                    hit_id = len(hits)
+                    by_cell[cell] = hit_id
+                    hits.append(
+                        LessonHit(
+                            day_index,
+                            row_index,
+                            day.weekday,
+                            row.time,
+                            row.lessons,
+                        )
+                    )
+                    for word in words(row.lessons):
+                        postings.setdefault(word, set()).add(hit_id)
+                hits[hit_id].groups.append(location.name)
+    index_words = sorted(postings)
+    return LessonIndex(
+        index_words, [sorted(postings[w]) for w in index_words], hits
+    )
+
+
+class LessonIndex:
+    # Inverted index from the words of every lesson cell to the cells:
+    # postings[i] are the cells containing words[i]. The sequences may
+    # also read a memory-mapped snapshot, see domain/snapshot_file.py.
+    def __init__(
+        self,
+        words: Sequence[str],
+        postings: Sequence[Sequence[int]],
+        hits: Sequence[LessonHit],
+    ):
+        self.__words = words
+        self.__postings = postings
+        self.__hits = hits
+
+    def __len__(self) -> int:
+        return len(self.__hits)
+
+    @property
+    def words(self) -> Sequence[str]:
+        return self.__words
+
+    @property
+    def postings(self) -> Sequence[Sequence[int]]:
+        return self.__postings
+
+    @property
+    def hits(self) -> Sequence[LessonHit]:
+        return self.__hits
+
+    def __matching(self, query_word: str) -> Set[int]:
+        # Every indexed word that starts with the stem of the query word.
+        # Numbers, e.g. rooms, match exactly.
+        if query_word.isdigit():
+            i = bisect_left(self.__words, query_word)
+            if i < len(self.__words) and self.__words[i] == query_word:
+                return set(self.__postings[i])
+            return set()
+        prefix = stem(query_word)
+        matches: Set[int] = set()
+        i = bisect_left(self.__words, prefix)
+        while i < len(self.__words) and self.__words[i].startswith(prefix):
+            matches.update(self.__postings[i])
+            i += 1
+        return matches
+
+    def search(self, query: str) -> List[LessonHit]:
+        # Cells containing all of the query words, in timetable order
+        query_words = [w for w in words(query) if is_search_word(w)]
+        if not query_words:
+            return []
+        found: Set[int] | None = None
+        for word in sorted(query_words, key=len, reverse=True):
+            matches = self.__matching(word)
+            found = matches if found is None else found & matches
+            if not found:
+                return []
+        return sorted(
+            (self.__hits[i] for i in found),
+            key=lambda h: (h.day_index, h.row_index),
+        )
@@ -1 +1,5 @@
 USER_HIGHLIGHT_PHRASES_LEN = 2048
+TIMETABLE_RANGE_MAX_DAYS = 62
+TELEGRAM_MESSAGE_LEN = 4096
+INLINE_PAGE_SIZE = 10
+SEARCH_MAX_HITS = 50
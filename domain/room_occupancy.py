@@ -0,0 +1,103 @@
+from domain.group_index import GroupLocation
+from domain.timetable_parser import Timetable
+from typing import Dict, Iterable, List, Tuple
+import re
+
+# E.g. "ауд. 557", "аудитория 101а", "каб 12"
+ROOM = re.compile(
+    r"\b(?:ауд(?:итория)?|каб(?:инет)?)\.?\s*(\d+[а-яa-z]?)\b",
+    re.IGNORECASE,
+)
+
+
+def extract_rooms(lessons: str | None) -> List[str]:
+    return [room.casefold() for room in ROOM.findall(lessons or "")]
+
+
+def room_sort_key(room: str) -> Tuple[int, str]:
+    digits = re.match(r"\d+", room)
+    return (int(digits.group()) if digits else 0, room)
+
+
+def build_room_occupancy(
+    timetables: Iterable[Tuple[GroupLocation, Timetable]],
+) -> "RoomOccupancy":
+    occupied: Dict[Tuple[int, int], set] = {}
+    times: Dict[Tuple[int, int], str] = {}
+    weekdays: Dict[int, str] = {}
+    rooms = set()
+    for _, tt in timetables:
+        for day_index, day in enumerate(tt.timetable):
+            weekdays.setdefault(day_index, day.weekday)
+            for slot, row in enumerate(day.timetable):
+                times.setdefault((day_index, slot), row.time)
+                found = extract_rooms(row.lessons)
+                if found:
+                    occupied.setdefault((day_index, slot), set()).update(found)
+                    rooms.update(found)
+    sorted_rooms = sorted(rooms, key=room_sort_key)
+    bits = {room: 1 << i for i, room in enumerate(sorted_rooms)}
+    masks: Dict[Tuple[int, int], int] = {}
+    for key, slot_rooms in occupied.items():
+        mask = 0
+        for room in slot_rooms:
+            mask |= bits[room]
+        masks[key] = mask
+    return RoomOccupancy(sorted_rooms, weekdays, times, masks)
+
+
+class RoomOccupancy:
+    # One bit per room for every (weekday, slot), so that free rooms are
+    # a bitwise difference with the set of all known rooms
+    def __init__(
+        self,
+        rooms: List[str],
+        weekdays: Dict[int, str],
+        times: Dict[Tuple[int, int], str],
+        occupied: Dict[Tuple[int, int], int],
+    ):
+        self.__rooms = rooms
+        self.__weekdays = weekdays
+        self.__times = times
+        self.__occupied = occupied
+        self.__all = (1 << len(rooms)) - 1
+
+    @property
+    def rooms(self) -> List[str]:
+        return self.__rooms
+
+    @property
+    def weekdays(self) -> Dict[int, str]:
+        return self.__weekdays
+
+    @property
+    def times(self) -> Dict[Tuple[int, int], str]:
+        # (weekday, slot) -> time of the slot
+        return self.__times
+
+    @property
+    def occupied(self) -> Dict[Tuple[int, int], int]:
+        # (weekday, slot) -> bits of the rooms in use
+        return self.__occupied
+
+    def weekday(self, day_index: int) -> str | None:
+        return self.__weekdays.get(day_index)
+
+    def slot_time(self, day_index: int, slot: int) -> str | None:
+        return self.__times.get((day_index, slot))
+
+    def slots(self, day_index: int) -> int:
+        return sum(1 for d, _ in self.__times if d == day_index)
+
+    def __decode(self, mask: int) -> List[str]:
+        rooms = []
+        while mask:
+            low = mask & -mask
+            rooms.append(self.__rooms[low.bit_length() - 1])
+            mask ^= low
+        return rooms
+
+    def free_rooms(self, day_index: int, slot: int) -> List[str]:
+        return self.__decode(
+            self.__all & ~self.__occupied.get((day_index, slot), 0)
+        )
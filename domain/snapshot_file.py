@@ -0,0 +1,370 @@
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+from functools import lru_cache
+from domain.group_index import GroupIndex, GroupLocation
+from domain.lesson_index import LessonHit, LessonIndex, build_lesson_index
+from domain.room_occupancy import RoomOccupancy, build_room_occupancy
+from domain.timetable_parser import Timetable, TimetableRow, WeekdayTimetable
+import mmap
+import os
+import struct
+
+# Layout (little-endian), sections follow each other:
+#   header
+#   strings:    (offset, length) of every string in the blob
+#   groups:     (name, sheet, column, first day, day count)
+#   days:       (weekday, first row, row count)
+#   rows:       (time, lessons)
+#   hits:       (day, row, weekday, time, lessons, first group, group count)
+#               of every distinct lesson cell, see LessonIndex
+#   hit groups: (name) of the groups of every hit
+#   words:      (word, first posting, posting count), sorted by word
+#   postings:   (hit) for every word
+#   rooms:      (name), sorted, see RoomOccupancy
+#   weekdays:   (day, weekday) known to the room occupancy
+#   slots:      (day, slot, time)
+#   masks:      bits of the occupied rooms of every slot, a whole number
+#               of bytes per slot
+#   blob:       UTF-8 text of all distinct strings
+# Strings are referenced by their number, so every distinct lesson text is
+# stored once for all groups. The indexes over all groups are built once
+# by the publisher, so workers neither build nor hold them.
+MAGIC = b"TTSNAP03"
+STRING = struct.Struct("<II")
+GROUP = struct.Struct("<IIIII")
+DAY = struct.Struct("<III")
+ROW = struct.Struct("<II")
+HIT = struct.Struct("<IIIIIII")
+ID = struct.Struct("<I")
+WORD = struct.Struct("<III")
+WEEKDAY = struct.Struct("<II")
+SLOT = struct.Struct("<III")
+SECTIONS = [
+    ("strings", STRING),
+    ("groups", GROUP),
+    ("days", DAY),
+    ("rows", ROW),
+    ("hits", HIT),
+    ("hit_groups", ID),
+    ("words", WORD),
+    ("postings", ID),
+    ("rooms", ID),
+    ("weekdays", WEEKDAY),
+    ("slots", SLOT),
+]
+HEADER = struct.Struct("<8s" + "I" * len(SECTIONS))
+NO_STRING = 0xFFFFFFFF
+
+T = TypeVar("T")
+
+
+class SnapshotFileError(Exception):
+    pass
+
+
+def mask_size(rooms: int) -> int:
+    return (rooms + 7) // 8
+
+
+def write_snapshot_file(
+    timetables: Iterable[Tuple[GroupLocation, Timetable]],
+    filename: str,
+):
+    string_ids: Dict[str, int] = {}
+    blob = bytearray()
+    sections: Dict[str, list] = {name: [] for name, _ in SECTIONS}
+    strings = sections["strings"]
+
+    def string_id(value) -> int:
+        if value is None:
+            return NO_STRING
+        value = str(value)
+        sid = string_ids.get(value)
+        if sid is None:
+            data = value.encode("utf-8")
+            sid = len(strings)
+            string_ids[value] = sid
+            strings.append((len(blob), len(data)))
+            blob.extend(data)
+        return sid
+
+    timetables = list(timetables)
+    groups, days, rows = sections["groups"], sections["days"], sections["rows"]
+    for location, tt in timetables:
+        groups.append(
+            (
+                string_id(location.name),
+                location.sheet,
+                location.column,
+                len(days),
+                len(tt.timetable),
+            )
+        )
+        for day in tt.timetable:
+            days.append(
+                (string_id(day.weekday), len(rows), len(day.timetable))
+            )
+            for row in day.timetable:
+                rows.append((string_id(row.time), string_id(row.lessons)))
+
+    lesson_index = build_lesson_index(timetables)
+    hit_groups = sections["hit_groups"]
+    for hit in lesson_index.hits:
+        sections["hits"].append(
+            (
+                hit.day_index,
+                hit.row_index,
+                string_id(hit.weekday),
+                string_id(hit.time),
+                string_id(hit.lessons),
+                len(hit_groups),
+                len(hit.groups),
+            )
+        )
+        hit_groups.extend((string_id(group),) for group in hit.groups)
+    postings = sections["postings"]
+    for word, word_postings in zip(lesson_index.words, lesson_index.postings):
+        sections["words"].append(
+            (string_id(word), len(postings), len(word_postings))
+        )
+        postings.extend((hit_id,) for hit_id in word_postings)
+
+    occupancy = build_room_occupancy(timetables)
+    sections["rooms"] = [(string_id(room),) for room in occupancy.rooms]
+    sections["weekdays"] = [
+        (day_index, string_id(weekday))
+        for day_index, weekday in sorted(occupancy.weekdays.items())
+    ]
+    masks = bytearray()
+    for (day_index, slot), time in sorted(occupancy.times.items()):
+        sections["slots"].append((day_index, slot, string_id(time)))
+        masks.extend(
+            occupancy.occupied.get((day_index, slot), 0).to_bytes(
+                mask_size(len(occupancy.rooms)), "little"
+            )
+        )
+
+    # Written next to the target and renamed over it, so that workers
+    # mapping the old file never see a partially written one
+    tmp_filename = filename + ".part"
+    with open(tmp_filename, "wb") as f:
+        f.write(
+            HEADER.pack(MAGIC, *(len(sections[name]) for name, _ in SECTIONS))
+        )
+        for name, record in SECTIONS:
+            f.write(b"".join(record.pack(*item) for item in sections[name]))
+        f.write(masks)
+        f.write(blob)
+    os.replace(tmp_filename, filename)
+
+
+class MappedRecords(Sequence[T], Generic[T]):
+    # Records of one section, decoded on every access
+    def __init__(
+        self,
+        view: memoryview,
+        at: int,
+        count: int,
+        record: struct.Struct,
+        decode: Callable[..., T],
+    ):
+        self.__view = view
+        self.__at = at
+        self.__count = count
+        self.__record = record
+        self.__decode = decode
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.__count))]
+        if i < 0:
+            i += self.__count
+        if not 0 <= i < self.__count:
+            raise IndexError(i)
+        return self.__decode(
+            *self.__record.unpack_from(
+                self.__view, self.__at + self.__record.size * i
+            )
+        )
+
+
+class MappedTimetableSnapshot:
+    # Same interface as TimetableSnapshot, but backed by a read-only
+    # memory map. Every process mapping the file shares the same pages.
+    def __init__(self, filename: str, version: Hashable = None):
+        with open(filename, "rb") as f:
+            self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__view = memoryview(self.__mmap)
+        if len(self.__view) < HEADER.size:
+            raise SnapshotFileError("Snapshot file is truncated.")
+        magic, *counts = HEADER.unpack_from(self.__view)
+        if magic != MAGIC:
+            raise SnapshotFileError("Not a timetable snapshot file.")
+        self.__version = version
+        self.__counts = dict(zip((name for name, _ in SECTIONS), counts))
+        self.__at: Dict[str, int] = {}
+        at = HEADER.size
+        for name, record in SECTIONS:
+            self.__at[name] = at
+            at += record.size * self.__counts[name]
+        self.__mask_size = mask_size(self.__counts["rooms"])
+        self.__masks_at = at
+        self.__blob_at = at + self.__mask_size * self.__counts["slots"]
+        self.__groups: Dict[Tuple[int, int], int] = {}
+        locations = []
+        for i, (name, sheet, column, _, _) in enumerate(
+            self.__records("groups", lambda *group: group)
+        ):
+            self.__groups[(sheet, column)] = i
+            locations.append(GroupLocation(self.__string(name), sheet, column))
+        self.__index = GroupIndex(locations)
+        # Decoded timetables are per process and cost every worker
+        # memory, and rendered days are cached above anyway. So only the
+        # few groups being asked about right now are kept.
+        self.__timetable = lru_cache(maxsize=16)(self.__load_timetable)
+        self.__lesson_index = LessonIndex(
+            self.__records("words", lambda word, _, __: self.__string(word)),
+            self.__records("words", self.__postings),
+            self.__records("hits", self.__hit),
+        )
+        self.__room_occupancy = self.__load_room_occupancy()
+
+    @property
+    def version(self) -> Hashable:
+        return self.__version
+
+    @property
+    def index(self) -> GroupIndex:
+        return self.__index
+
+    @property
+    def lesson_index(self) -> LessonIndex:
+        return self.__lesson_index
+
+    @property
+    def room_occupancy(self) -> RoomOccupancy:
+        return self.__room_occupancy
+
+    def __records(
+        self, section: str, decode: Callable[..., T]
+    ) -> MappedRecords[T]:
+        return MappedRecords(
+            self.__view,
+            self.__at[section],
+            self.__counts[section],
+            dict(SECTIONS)[section],
+            decode,
+        )
+
+    def __ids(self, section: str, first: int, count: int) -> Tuple[int, ...]:
+        return struct.unpack_from(
+            f"<{count}I", self.__view, self.__at[section] + ID.size * first
+        )
+
+    def __string(self, sid: int) -> str | None:
+        if sid == NO_STRING:
+            return None
+        offset, length = STRING.unpack_from(
+            self.__view, self.__at["strings"] + STRING.size * sid
+        )
+        start = self.__blob_at + offset
+        return str(self.__view[start : start + length], "utf-8")
+
+    def __postings(self, _, first: int, count: int) -> Tuple[int, ...]:
+        return self.__ids("postings", first, count)
+
+    def __hit(
+        self,
+        day_index: int,
+        row_index: int,
+        weekday: int,
+        time: int,
+        lessons: int,
+        first_group: int,
+        group_count: int,
+    ) -> LessonHit:
+        return LessonHit(
+            day_index,
+            row_index,
+            self.__string(weekday),
+            self.__string(time),
+            self.__string(lessons),
+            [
+                self.__string(group)
+                for group in self.__ids("hit_groups", first_group, group_count)
+            ],
+        )
+
+    def __load_room_occupancy(self) -> RoomOccupancy:
+        # Small once built: rooms and a few dozen slots. Building it takes
+        # every group though, which is done by the publisher.
+        times, occupied = {}, {}
+        for i, (day_index, slot, time) in enumerate(
+            self.__records("slots", lambda *slot: slot)
+        ):
+            times[(day_index, slot)] = self.__string(time)
+            at = self.__masks_at + self.__mask_size * i
+            mask = int.from_bytes(
+                self.__view[at : at + self.__mask_size], "little"
+            )
+            if mask:
+                occupied[(day_index, slot)] = mask
+        return RoomOccupancy(
+            list(self.__records("rooms", self.__string)),
+            {
+                day_index: self.__string(weekday)
+                for day_index, weekday in self.__records(
+                    "weekdays", lambda *weekday: weekday
+                )
+            },
+            times,
+            occupied,
+        )
+
+    def __load_timetable(self, group: int) -> Timetable:
+        _, _, _, first_day, day_count = GROUP.unpack_from(
+            self.__view, self.__at["groups"] + GROUP.size * group
+        )
+        timetable = Timetable()
+        for d in range(first_day, first_day + day_count):
+            weekday, first_row, row_count = DAY.unpack_from(
+                self.__view, self.__at["days"] + DAY.size * d
+            )
+            timetable.add_weekday(WeekdayTimetable(self.__string(weekday)))
+            for r in range(first_row, first_row + row_count):
+                time, lessons = ROW.unpack_from(
+                    self.__view, self.__at["rows"] + ROW.size * r
+                )
+                timetable.add_row_to_last_weekday(
+                    TimetableRow(self.__string(time), self.__string(lessons))
+                )
+        return timetable
+
+    def get(self, group: str) -> Timetable | None:
+        location = self.__index.get(group)
+        if location is None:
+            return None
+        i = self.__groups.get((location.sheet, location.column))
+        return self.__timetable(i) if i is not None else None
+
+    def __iter__(self) -> Iterator[Tuple[GroupLocation, Timetable]]:
+        for i, (name, sheet, column, _, _) in enumerate(
+            self.__records("groups", lambda *group: group)
+        ):
+            # Not through the cache, a full pass would only evict it
+            yield GroupLocation(
+                self.__string(name), sheet, column
+            ), self.__load_timetable(i)
@@ -1,8 +1,12 @@
 from urllib.parse import urlparse
+from hashlib import md5
+from io import BytesIO
+import os
+import zipfile
 import requests
 
 
-def download_timetable_from_url(url: str, into_filename: str):
+def download_timetable_from_url(url: str) -> bytes:
     o = urlparse(url)
     export_url = o._replace(
         fragment="",
@@ -11,5 +15,29 @@ def download_timetable_from_url(url: str, into_filename: str):
     ).geturl()
 
     resp = requests.get(export_url, timeout=10)
-    with open(into_filename, "wb") as f:
-        f.write(resp.content)
+    resp.raise_for_status()
+    return resp.content
+
+
+def save_timetable(content: bytes, into_filename: str):
+    # Readers check whether the file exists, so it must never be seen
+    # half-written.
+    tmp_filename = into_filename + ".part"
+    with open(tmp_filename, "wb") as f:
+        f.write(content)
+    os.replace(tmp_filename, into_filename)
+
+
+def get_timetable_hash(content: bytes) -> str:
+    # Export metadata (creation time etc.) may differ between downloads of
+    # the same sheet, so only the workbook parts themselves are hashed.
+    h = md5()
+    try:
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            for name in sorted(archive.namelist()):
+                if not name.startswith("docProps/"):
+                    h.update(name.encode("utf-8"))
+                    h.update(archive.read(name))
+    except zipfile.BadZipFile:
+        return md5(content).hexdigest()
+    return h.hexdigest()
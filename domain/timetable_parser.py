@@ -1,10 +1,27 @@
-import openpyxl
-from openpyxl.worksheet.worksheet import Worksheet
-from typing import List
+from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+from domain.group_index import GroupLocation
 import re
+import sys
+
+if TYPE_CHECKING:
+    from openpyxl.worksheet.worksheet import Worksheet
+
+# openpyxl takes a noticeable time to import, so it is only imported
+# when a workbook actually needs to be parsed.
+
+# Why 42 rows? Because 7 lessons per day, six days a week.
+FIRST_ROW = 3
+LAST_ROW = 44
+# Why 100? No reason.
+LAST_COLUMN = 100
+# A column header may name several groups, e.g. "11-101, 11-102"
+GROUP_NAME = re.compile(r"\b\d{1,2}[-‐-―−]\d{2,3}\w{0,2}\b")
 
 
 class TimetableRow:
+    # Rows are shared between groups, so they have to stay small
+    __slots__ = ("__time", "__lessons")
+
     def __init__(self, time: str, lessons: str):
         self.__time = time
         self.__lessons = lessons
@@ -19,6 +36,8 @@ class TimetableRow:
 
 
 class WeekdayTimetable:
+    __slots__ = ("__weekday", "__timetable")
+
     def __init__(self, weekday: str):
         self.__weekday = weekday
         self.__timetable = []
@@ -36,6 +55,8 @@ class WeekdayTimetable:
 
 
 class Timetable:
+    __slots__ = ("__timetable",)
+
     def __init__(self):
         self.__timetable = []
 
@@ -50,55 +71,122 @@ class Timetable:
         return self.__timetable
 
 
-def get_merged_cell_val(sheet: Worksheet, cell) -> str:
-    rng = [s for s in sheet.merged_cells.ranges if cell.coordinate in s]
-    value = (
-        sheet.cell(rng[0].min_row, rng[0].min_col).value
-        if len(rng) != 0
-        else cell.value
-    )
+class RowPool:
+    # Deduplicates strings and whole rows across all groups of a workbook:
+    # a lecture for a whole stream is stored once, not once per group.
+    def __init__(self):
+        self.__rows: Dict[Tuple[str, str], TimetableRow] = {}
+
+    def row(self, time, lessons: str) -> TimetableRow:
+        if isinstance(time, str):
+            time = sys.intern(time)
+        key = (time, lessons)
+        row = self.__rows.get(key)
+        if row is None:
+            row = TimetableRow(time, sys.intern(lessons))
+            self.__rows[key] = row
+        return row
+
+
+def normalize_cell_value(value) -> str:
     if not value:  # value can be None
         value = ""
-    value = "\n".join(
+    return "\n".join(
         map(
             lambda x: " ".join(x.split()),
-            filter(lambda x: x.strip(), value.splitlines()),
+            filter(lambda x: x.strip(), str(value).splitlines()),
         )
     )  # Remove excessive line breaks and spaces
-    return value
+
+
+def get_merged_cells_map(
+    sheet: "Worksheet",
+) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    # (row, column) of every merged cell -> its top left cell, so that
+    # looking a cell up does not scan all merged ranges of the sheet
+    merged = {}
+    for rng in sheet.merged_cells.ranges:
+        for row in range(max(rng.min_row, FIRST_ROW), rng.max_row + 1):
+            if row > LAST_ROW:
+                break
+            for col in range(rng.min_col, rng.max_col + 1):
+                merged[(row, col)] = (rng.min_row, rng.min_col)
+    return merged
+
+
+def get_merged_cell_val(
+    sheet: "Worksheet",
+    cell,
+    merged: Dict[Tuple[int, int], Tuple[int, int]] | None = None,
+) -> str:
+    if merged is None:
+        merged = get_merged_cells_map(sheet)
+    origin = merged.get((cell.row, cell.column))
+    value = sheet.cell(*origin).value if origin else cell.value
+    return normalize_cell_value(value)
 
 
 def get_timetable_for_week_from_worksheet(
-    ws: Worksheet, required_col: int
+    ws: "Worksheet",
+    required_col: int,
+    merged: Dict[Tuple[int, int], Tuple[int, int]] | None = None,
+    pool: RowPool | None = None,
 ) -> Timetable:
+    if merged is None:
+        merged = get_merged_cells_map(ws)
+    if pool is None:
+        pool = RowPool()
     timetable = Timetable()
-    for row in ws.iter_rows(
-        3, 44, required_col, required_col
-    ):  # Why 42 rows? Because 7 lessons per day, six days a week.
+    for row in ws.iter_rows(FIRST_ROW, LAST_ROW, required_col, required_col):
         weekday = ws.cell(row[0].row, 1).value
         if weekday:  # Beginning of a new weekday
             timetable.add_weekday(
                 WeekdayTimetable(
-                    weekday.replace("\n", "").replace(" ", "").capitalize()
+                    sys.intern(
+                        weekday.replace("\n", "").replace(" ", "").capitalize()
+                    )
                 )
             )  # Weekdays are made to appear vertical with newlines
         time = ws.cell(row[0].row, 2).value
-        lessons = get_merged_cell_val(ws, row[0])
-        timetable.add_row_to_last_weekday(TimetableRow(time, lessons))
+        lessons = get_merged_cell_val(ws, row[0], merged)
+        timetable.add_row_to_last_weekday(pool.row(time, lessons))
     if len(timetable.timetable) == 6:
         # To account for Sunday
         timetable.add_weekday(WeekdayTimetable("Воскресенье"))
     return timetable
 
 
-def get_timetable_for_group_from_file(
-    filename: str, group: str
-) -> Timetable | None:
+def get_group_locations_from_worksheet(
+    ws: "Worksheet", sheet: int
+) -> Iterator[GroupLocation]:
+    for headers in ws.iter_rows(2, 2, 1, LAST_COLUMN, values_only=True):
+        for column, header in enumerate(headers, start=1):
+            if not isinstance(header, str) or not header.split():
+                continue
+            names = GROUP_NAME.findall(header)
+            if not names:
+                # Not a usual group name, the first word of the header
+                names = [header.split()[0].rstrip(",;.:")]
+            for name in names:
+                yield GroupLocation(name, sheet, column)
+
+
+def get_all_timetables_from_file(
+    filename: str,
+) -> Iterator[Tuple[GroupLocation, Timetable]]:
+    import openpyxl
+
     workbook = openpyxl.load_workbook(filename)
-    for ws in workbook.worksheets:
-        for col in ws.iter_cols(1, 100, 2, 2):  # Why 100? No reason.
-            if re.match(
-                rf"\b{re.escape(group)}\b", col[0].value or "", re.IGNORECASE
-            ):
-                return get_timetable_for_week_from_worksheet(ws, col[0].column)
-    return None
+    pool = RowPool()
+    for sheet, ws in enumerate(workbook.worksheets):
+        merged = get_merged_cells_map(ws)
+        # Groups sharing a column share its timetable
+        timetables: Dict[int, Timetable] = {}
+        for location in get_group_locations_from_worksheet(ws, sheet):
+            timetable = timetables.get(location.column)
+            if timetable is None:
+                timetable = get_timetable_for_week_from_worksheet(
+                    ws, location.column, merged, pool
+                )
+                timetables[location.column] = timetable
+            yield location, timetable
@@ -0,0 +1,76 @@
+from typing import Dict, Hashable, Iterable, Iterator, List, Tuple
+from domain.group_index import GroupIndex, GroupLocation
+from domain.lesson_index import LessonIndex, build_lesson_index
+from domain.room_occupancy import RoomOccupancy, build_room_occupancy
+from domain.timetable_parser import Timetable, get_all_timetables_from_file
+from threading import Lock
+import os
+
+
+def get_file_version(filename: str) -> Tuple[int, int, int] | None:
+    # Changes whenever the file is replaced or rewritten
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class TimetableSnapshot:
+    # Every group of one downloaded timetable, parsed once and kept in memory
+    def __init__(
+        self,
+        timetables: Iterable[Tuple[GroupLocation, Timetable]],
+        version: Hashable = None,
+    ):
+        self.__version = version
+        self.__timetables: Dict[Tuple[int, int], Timetable] = {}
+        self.__locations: List[GroupLocation] = []
+        for location, timetable in timetables:
+            self.__timetables[(location.sheet, location.column)] = timetable
+            self.__locations.append(location)
+        self.__index = GroupIndex(self.__locations)
+        # Indexes over all groups are built on first use
+        self.__indexes_lock = Lock()
+        self.__lesson_index: LessonIndex | None = None
+        self.__room_occupancy: RoomOccupancy | None = None
+
+    @property
+    def version(self) -> Hashable:
+        return self.__version
+
+    @property
+    def index(self) -> GroupIndex:
+        return self.__index
+
+    @property
+    def lesson_index(self) -> LessonIndex:
+        with self.__indexes_lock:
+            if self.__lesson_index is None:
+                self.__lesson_index = build_lesson_index(self)
+            return self.__lesson_index
+
+    @property
+    def room_occupancy(self) -> RoomOccupancy:
+        with self.__indexes_lock:
+            if self.__room_occupancy is None:
+                self.__room_occupancy = build_room_occupancy(self)
+            return self.__room_occupancy
+
+    def get(self, group: str) -> Timetable | None:
+        location = self.__index.get(group)
+        if location is None:
+            return None
+        return self.__timetables.get((location.sheet, location.column))
+
+    def __iter__(self) -> Iterator[Tuple[GroupLocation, Timetable]]:
+        for location in self.__locations:
+            yield location, self.__timetables[
+                (location.sheet, location.column)
+            ]
+
+
+def load_workbook_snapshot(
+    filename: str, version: Hashable = None
+) -> TimetableSnapshot:
+    return TimetableSnapshot(get_all_timetables_from_file(filename), version)
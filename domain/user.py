@@ -9,10 +9,12 @@ class ConversationState(IntEnum):
     IDLE = 1
     SETTING_GROUP = 2
     SETTING_HIGHLIGHT_PHRASES = 3
+    SETTING_DIGEST_TIME = 4
 
     # Administration states
     SETTING_LINK = 256
     SETTING_WEEK_COUNT_START = 257
+    SETTING_BROADCAST_TEXT = 258
 
 
 class User:
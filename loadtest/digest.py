@@ -0,0 +1,137 @@
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from tempfile import TemporaryDirectory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from loadtest.fake_bot_api import FakeBotApi  # noqa: E402
+from loadtest.replay import (  # noqa: E402
+    FIRST_USER_ID,
+    ReplyTracker,
+    message_update,
+    percentile,
+    replay,
+)
+
+LOCAL_OFFSET = timedelta(hours=3)
+# The bot prepares digests this long before they are due
+LEAD = 60
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Subscribe users to the daily digest due in a couple of "
+        "minutes and measure how the bot spreads it."
+    )
+    parser.add_argument("--timetable", help="XLSX timetable to serve.")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument(
+        "--rate", type=float, default=200.0, help="Setup updates per second."
+    )
+    parser.add_argument(
+        "--window", type=float, default=60.0, help="DIGEST_WINDOW, s."
+    )
+    parser.add_argument(
+        "--send-rate", type=float, default=25.0, help="BULK_SEND_RATE."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Mean API latency, s."
+    )
+    parser.add_argument(
+        "--bot-args",
+        default="",
+        help="Extra command line arguments for main.py.",
+    )
+    args = parser.parse_args()
+
+    from loadtest.replay import start_bot
+
+    with TemporaryDirectory() as tmp:
+        timetable = args.timetable
+        if not timetable:
+            from benchmarks.timetable_memory import make_workbook
+
+            timetable = os.path.join(tmp, "timetable.xlsx")
+            make_workbook(timetable, 2, 40)
+        from domain.timetable_parser import get_all_timetables_from_file
+        from domain.timetable_snapshot import TimetableSnapshot
+
+        groups = TimetableSnapshot(
+            get_all_timetables_from_file(timetable)
+        ).index.names
+
+        fake = FakeBotApi(latency=args.latency)
+        tracker = ReplyTracker()
+        fake.on_request(tracker.on_request)
+        fake.start()
+        bot, log = start_bot(
+            fake,
+            timetable,
+            tmp,
+            args.bot_args.split(),
+            {
+                "DIGEST_WINDOW": str(args.window),
+                "BULK_SEND_RATE": str(args.send_rate),
+            },
+        )
+        try:
+            # Due at the first minute that leaves time for the setup
+            setup_time = args.users * 4 / args.rate + 5
+            due = (
+                datetime.now(timezone.utc)
+                + timedelta(seconds=setup_time + LEAD + 60)
+            ).replace(second=0, microsecond=0)
+            local = due + LOCAL_OFFSET
+            rnd = random.Random(42)
+            # Phase by phase, a user's reply must not arrive before the
+            # previous command changed the conversation state
+            user_ids = range(FIRST_USER_ID, FIRST_USER_ID + args.users)
+            phases = [
+                [message_update(u, 1, "/setgroup") for u in user_ids],
+                [message_update(u, 2, rnd.choice(groups)) for u in user_ids],
+                [message_update(u, 3, "/digest") for u in user_ids],
+                [message_update(u, 4, f"{local:%H:%M}") for u in user_ids],
+            ]
+            print(f"Subscribing {args.users} users for {local:%H:%M}...")
+            for phase in phases:
+                replay(fake, tracker, phase, args.rate, 30)
+                if tracker.pending:
+                    print(f"{tracker.pending} setup updates were not answered")
+                    tracker.reset()
+            sent_before = len(fake.sent)
+            wait = due.timestamp() + args.window + 10 - time.time()
+            print(f"Waiting {wait:.0f} s for the digest...")
+            time.sleep(max(0, wait))
+
+            sends = [
+                r for r in fake.sent[sent_before:] if r.method == "sendMessage"
+            ]
+            # SentRequest.at is monotonic, the due time is wall clock
+            offset = time.time() - time.monotonic()
+            delays = [r.at + offset - due.timestamp() for r in sends]
+            per_second = Counter(int(d) for d in delays)
+            print(f"Digests sent:       {len(sends)} of {args.users}")
+            if delays:
+                print(f"First send:         {min(delays):+.1f} s")
+                print(f"Last send:          {max(delays):+.1f} s")
+                print(f"Delay p50:          {percentile(delays, 50):.1f} s")
+                print(f"Peak rate:          {max(per_second.values())}/s")
+            with open(os.path.join(tmp, "bot.log")) as f:
+                for line in f:
+                    if "digest" in line:
+                        print(line.rstrip())
+        finally:
+            bot.terminate()
+            bot.wait()
+            fake.stop()
+            log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import json
+import random
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Lock, Thread
+from typing import Callable, Dict, List, Set
+from urllib.parse import parse_qsl, urlparse
+
+BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "Fake",
+    "username": "fake_bot",
+}
+
+
+class SentRequest:
+    def __init__(self, method: str, params: Dict[str, str], at: float):
+        self.__method = method
+        self.__params = params
+        self.__at = at
+
+    @property
+    def method(self) -> str:
+        return self.__method
+
+    @property
+    def params(self) -> Dict[str, str]:
+        return self.__params
+
+    @property
+    def at(self) -> float:
+        return self.__at
+
+
+class FakeBotApi:
+    # A local stand-in for https://api.telegram.org, good enough for
+    # pyTelegramBotAPI. Point the bot at it with BOT_API_URL.
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: int = 1,
+    ):
+        self.__latency = latency
+        self.__error_rate = error_rate
+        self.__retry_after = retry_after
+        self.__random = random.Random(42)
+        self.__updates: List[dict] = []
+        self.__updates_cond = Condition()
+        self.__next_update_id = 1
+        self.__next_message_id = 1
+        self.__lock = Lock()
+        self.__sent: List[SentRequest] = []
+        self.__listeners: List[Callable[[SentRequest], None]] = []
+        self.__errors = 0
+        self.__blocked: Set[int] = set()
+        self.__server = ThreadingHTTPServer((host, port), self.__handler())
+        self.__server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def sent(self) -> List[SentRequest]:
+        with self.__lock:
+            return list(self.__sent)
+
+    @property
+    def injected_errors(self) -> int:
+        return self.__errors
+
+    def on_request(self, listener: Callable[[SentRequest], None]):
+        self.__listeners.append(listener)
+
+    def start(self):
+        Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def block(self, chat_id: int):
+        # Messages to this chat fail as if the user blocked the bot
+        self.__blocked.add(chat_id)
+
+    def push_update(self, update: dict) -> int:
+        with self.__updates_cond:
+            update = dict(update, update_id=self.__next_update_id)
+            self.__next_update_id += 1
+            self.__updates.append(update)
+            self.__updates_cond.notify_all()
+            return update["update_id"]
+
+    def __get_updates(self, params: Dict[str, str]) -> List[dict]:
+        offset = int(params.get("offset", 0))
+        timeout = float(params.get("timeout", 0))
+        limit = int(params.get("limit", 100))
+        deadline = time.monotonic() + timeout
+        with self.__updates_cond:
+            # Updates before the offset are confirmed and can be dropped
+            self.__updates = [
+                u for u in self.__updates if u["update_id"] >= offset
+            ]
+            while not self.__updates:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self.__updates_cond.wait(left)
+            return self.__updates[:limit]
+
+    def __message(self, params: Dict[str, str], **fields) -> dict:
+        with self.__lock:
+            message_id = self.__next_message_id
+            self.__next_message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        return dict(
+            {
+                "message_id": message_id,
+                "from": BOT_USER,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+            },
+            **fields,
+        )
+
+    def __call(self, method: str, params: Dict[str, str]):
+        if method == "getUpdates":
+            return self.__get_updates(params)
+        if method == "getMe":
+            return BOT_USER
+        if method == "sendMessage":
+            return self.__message(params, text=params.get("text", ""))
+        if method == "sendDocument":
+            return self.__message(
+                params,
+                document={
+                    "file_id": f"fake-file-{self.__random.getrandbits(32)}",
+                    "file_unique_id": "fake",
+                },
+            )
+        if method == "editMessageText":
+            return self.__message(params, text=params.get("text", ""))
+        # answerInlineQuery, answerCallbackQuery, setMessageReaction,
+        # setMyCommands, deleteWebhook, ...
+        return True
+
+    def __record(self, method: str, params: Dict[str, str]):
+        request = SentRequest(method, params, time.monotonic())
+        with self.__lock:
+            self.__sent.append(request)
+        for listener in self.__listeners:
+            listener(request)
+
+    def handle(self, method: str, params: Dict[str, str]):
+        if method != "getUpdates":
+            if self.__latency:
+                time.sleep(self.__random.expovariate(1 / self.__latency))
+            if self.__random.random() < self.__error_rate:
+                self.__errors += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after "
+                    f"{self.__retry_after}",
+                    "parameters": {"retry_after": self.__retry_after},
+                }
+            self.__record(method, params)
+            if int(params.get("chat_id", 0)) in self.__blocked:
+                return 403, {
+                    "ok": False,
+                    "error_code": 403,
+                    "description": "Forbidden: bot was blocked by the user",
+                }
+        return 200, {"ok": True, "result": self.__call(method, params)}
+
+    def __handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def __params(self) -> Dict[str, str]:
+                url = urlparse(self.path)
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                content_type = self.headers.get("Content-Type", "")
+                if content_type.startswith("multipart/form-data"):
+                    message = BytesParser(policy=HTTP).parsebytes(
+                        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+                    )
+                    for part in message.iter_parts():
+                        name = part.get_param(
+                            "name", header="content-disposition"
+                        )
+                        if part.get_filename():
+                            params[name] = part.get_filename()
+                        else:
+                            params[name] = part.get_content()
+                elif body:
+                    params.update(parse_qsl(body.decode("utf-8")))
+                return params
+
+            def __respond(self):
+                method = urlparse(self.path).path.rsplit("/", 1)[-1]
+                status, payload = api.handle(method, self.__params())
+                data = json.dumps(payload).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The bot went away, e.g. during a long poll
+
+            do_GET = __respond
+            do_POST = __respond
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API.")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeBotApi(
+        port=args.port, latency=args.latency, error_rate=args.error_rate
+    )
+    print(f"Listening on {fake.url}, use BOT_API_URL={fake.url}")
+    fake.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
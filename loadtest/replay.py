@@ -0,0 +1,326 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from tempfile import TemporaryDirectory
+from threading import Lock
+from typing import IO, Dict, Iterator, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from loadtest.fake_bot_api import FakeBotApi, SentRequest  # noqa: E402
+
+ADMIN_CHAT_ID = 1000
+FIRST_USER_ID = 100000
+REQUESTS = [
+    "/today",
+    "/tomorrow",
+    "/week",
+    "среда",
+    "на послезавтра",
+    "+1",
+    "-1",
+    "4",
+    "5.",
+]
+INLINE_REQUESTS = ["завтра", "пятница", ""]
+
+
+def message_update(user_id: int, message_id: int, text: str) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    return {
+        "message": {
+            "message_id": message_id,
+            "from": user,
+            "chat": {"id": user_id, "type": "private"},
+            "date": int(time.time()),
+            "text": text,
+        }
+    }
+
+
+def inline_update(user_id: int, query_id: str, query: str) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    return {
+        "inline_query": {
+            "id": query_id,
+            "from": user,
+            "query": query,
+            "offset": "",
+        }
+    }
+
+
+def update_key(update: dict) -> Tuple | None:
+    if "message" in update:
+        message = update["message"]
+        return ("message", message["chat"]["id"], message["message_id"])
+    if "inline_query" in update:
+        return ("inline", update["inline_query"]["id"])
+    if "callback_query" in update:
+        return ("callback", update["callback_query"]["id"])
+    return None
+
+
+def reply_key(request: SentRequest) -> Tuple | None:
+    params = request.params
+    if request.method == "answerInlineQuery":
+        return ("inline", params.get("inline_query_id"))
+    if request.method == "answerCallbackQuery":
+        return ("callback", params.get("callback_query_id"))
+    if request.method in ("sendMessage", "sendDocument", "setMessageReaction"):
+        message_id = params.get("reply_to_message_id") or params.get(
+            "message_id"
+        )
+        if "reply_parameters" in params:
+            message_id = json.loads(params["reply_parameters"]).get(
+                "message_id"
+            )
+        if message_id is None:
+            return None
+        return ("message", int(params.get("chat_id", 0)), int(message_id))
+    return None
+
+
+class ReplyTracker:
+    def __init__(self):
+        self.__lock = Lock()
+        self.__pending: Dict[Tuple, float] = {}
+        self.__latencies: List[float] = []
+        self.__error_replies = 0
+        self.__last_reply = 0.0
+
+    def sent(self, update: dict):
+        key = update_key(update)
+        if key is not None:
+            with self.__lock:
+                self.__pending[key] = time.monotonic()
+
+    def on_request(self, request: SentRequest):
+        key = reply_key(request)
+        with self.__lock:
+            if key is None or key not in self.__pending:
+                return
+            # Only the first reply to a request counts for latency
+            self.__latencies.append(request.at - self.__pending.pop(key))
+            self.__last_reply = request.at
+            if "ошибку" in request.params.get("text", ""):
+                self.__error_replies += 1
+
+    @property
+    def pending(self) -> int:
+        with self.__lock:
+            return len(self.__pending)
+
+    @property
+    def latencies(self) -> List[float]:
+        with self.__lock:
+            return list(self.__latencies)
+
+    @property
+    def error_replies(self) -> int:
+        return self.__error_replies
+
+    @property
+    def last_reply(self) -> float:
+        return self.__last_reply
+
+    def reset(self):
+        with self.__lock:
+            self.__pending.clear()
+            self.__latencies.clear()
+            self.__error_replies = 0
+
+
+def synthetic_updates(
+    groups: List[str], users: int, requests_per_user: int, seed: int = 42
+) -> Tuple[List[dict], List[dict]]:
+    # Returns (setup, measured) updates. Setup gives every user a group.
+    rnd = random.Random(seed)
+    setup, measured = [], []
+    message_ids = {}
+    for i in range(users):
+        user_id = FIRST_USER_ID + i
+        setup.append(message_update(user_id, 1, "/setgroup"))
+        setup.append(message_update(user_id, 2, rnd.choice(groups)))
+        message_ids[user_id] = 3
+    for n in range(users * requests_per_user):
+        user_id = FIRST_USER_ID + rnd.randrange(users)
+        if rnd.random() < 0.3:
+            query = rnd.choice(INLINE_REQUESTS)
+            if rnd.random() < 0.5:
+                query = f"{rnd.choice(groups)} {query}".strip()
+            measured.append(inline_update(user_id, f"q{n}", query))
+        else:
+            measured.append(
+                message_update(
+                    user_id, message_ids[user_id], rnd.choice(REQUESTS)
+                )
+            )
+            message_ids[user_id] += 1
+    return setup, measured
+
+
+def recorded_updates(filename: str) -> Iterator[dict]:
+    # One Telegram Update object per line, as returned by getUpdates
+    with open(filename, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def replay(
+    fake: FakeBotApi,
+    tracker: ReplyTracker,
+    updates: List[dict],
+    rate: float,
+    drain: float,
+) -> float:
+    started = time.monotonic()
+    for i, update in enumerate(updates):
+        delay = started + i / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        tracker.sent(update)
+        fake.push_update(update)
+    deadline = time.monotonic() + drain
+    while tracker.pending and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return started
+
+
+def percentile(values: List[float], p: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def report(fake: FakeBotApi, tracker: ReplyTracker, sent: int, started: float):
+    latencies = tracker.latencies
+    elapsed = max(tracker.last_reply - started, 1e-9)
+    print(f"Updates sent:       {sent}")
+    print(f"Replies:            {len(latencies)}")
+    print(f"Throughput:         {len(latencies) / elapsed:.1f} replies/s")
+    print(f"Latency p50:        {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"Latency p99:        {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"Unanswered:         {tracker.pending}")
+    print(f"Error replies:      {tracker.error_replies}")
+    print(f"Injected 429s:      {fake.injected_errors}")
+
+
+def start_bot(
+    fake: FakeBotApi,
+    timetable: str,
+    workdir: str,
+    bot_args: List[str],
+    env: Dict[str, str] | None = None,
+) -> Tuple[subprocess.Popen, IO]:
+    # Synthetic users are much chattier than real ones, so per-user
+    # rate limits are lifted unless set explicitly
+    bot_env = {
+        f"RATE_LIMIT_{kind}": "1000/1"
+        for kind in ("MESSAGE", "INLINE_QUERY", "CALLBACK_QUERY")
+    }
+    bot_env.update(
+        os.environ,
+        BOT_TOKEN="123456:fake",
+        ADMIN_CHAT_ID=str(ADMIN_CHAT_ID),
+        BOT_API_URL=fake.url,
+        TIMETABLE_FILE=timetable,
+        PYTHONUNBUFFERED="1",
+        **(env or {}),
+    )
+    log = open(os.path.join(workdir, "bot.log"), "w")
+    bot = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "main.py")] + bot_args,
+        cwd=workdir,
+        env=bot_env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    return bot, log
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay updates against main.py and a fake Bot API."
+    )
+    parser.add_argument(
+        "--timetable",
+        help="XLSX timetable to serve. A synthetic one is made by default.",
+    )
+    parser.add_argument(
+        "--updates", help="JSONL file with recorded updates to replay."
+    )
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests-per-user", type=int, default=10)
+    parser.add_argument(
+        "--rate", type=float, default=50.0, help="Updates per second."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Mean API latency, s."
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 429s."
+    )
+    parser.add_argument(
+        "--drain", type=float, default=30.0, help="Seconds to wait replies."
+    )
+    parser.add_argument(
+        "--bot-args",
+        default="",
+        help="Extra command line arguments for main.py.",
+    )
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        timetable = args.timetable
+        if not timetable:
+            from benchmarks.timetable_memory import make_workbook
+
+            timetable = os.path.join(tmp, "timetable.xlsx")
+            make_workbook(timetable, 2, 40)
+        from domain.timetable_parser import get_all_timetables_from_file
+        from domain.timetable_snapshot import TimetableSnapshot
+
+        groups = TimetableSnapshot(
+            get_all_timetables_from_file(timetable)
+        ).index.names
+
+        fake = FakeBotApi(latency=args.latency, error_rate=args.error_rate)
+        tracker = ReplyTracker()
+        fake.on_request(tracker.on_request)
+        fake.start()
+
+        bot, log = start_bot(fake, timetable, tmp, args.bot_args.split())
+        try:
+            if args.updates:
+                setup, measured = [], list(recorded_updates(args.updates))
+            else:
+                setup, measured = synthetic_updates(
+                    groups, args.users, args.requests_per_user
+                )
+            if setup:
+                print(f"Setting up {args.users} users...")
+                replay(fake, tracker, setup, args.rate, args.drain)
+                tracker.reset()
+            print(f"Replaying {len(measured)} updates at {args.rate}/s...")
+            started = replay(fake, tracker, measured, args.rate, args.drain)
+            report(fake, tracker, len(measured), started)
+        finally:
+            bot.terminate()
+            bot.wait()
+            fake.stop()
+            log.close()
+            if bot.returncode not in (0, -15):
+                with open(os.path.join(tmp, "bot.log")) as f:
+                    print(f.read())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,47 @@
+from time import monotonic
+
+# Taken before the rest of the imports to measure time to first reply
+STARTED_AT = monotonic()
+
+import argparse
+import multiprocessing
 import os
-from datetime import date
+from datetime import date, timedelta
+from functools import wraps
 from threading import Thread
-from typing import List, Iterator
+from typing import List, Iterator, Tuple
+from queue import Full
 from time import sleep
 from tempfile import gettempdir
 from hashlib import md5
-import sqlite3
+from itertools import islice
 import telebot
-import schedule
 from dotenv import load_dotenv
-from domain.user import ConversationState, User
+from domain.broadcast import Broadcast
+from domain.snapshot_file import MappedTimetableSnapshot
+from domain.limits import INLINE_PAGE_SIZE
+from domain.user import ConversationState
+from repositories.broadcasts_repository import BroadcastsRepository
+from repositories.calendar_files_repository import CalendarFilesRepository
+from repositories.connection import ThreadLocalConnection
+from repositories.digests_repository import DigestsRepository
 from repositories.settings_repository import SettingsRepository
 from repositories.users_repository import UsersRepository
+from repositories.timetable_checks_repository import (
+    TimetableChecksRepository,
+)
+from services.broadcast_service import BroadcastService
+from services.calendar_service import CalendarService
+from services.delivery import (
+    RecipientUnavailableException,
+    RetryAfterException,
+)
+from services.digest_service import DigestService
+from services.rate_limiter import RateLimiter
+from services.refresh_scheduler import RefreshScheduler
+from services.lru_cache import LruCache
+from services.snapshot_publisher import SnapshotPublisher
+from services.token_bucket import TokenBucketLimiter
 from services.timetable_service import TimetableService, GroupNotFoundException
 from services.timetable_updater_service import TimetableUpdaterService
 import services.types
@@ -20,24 +50,81 @@ telebot.apihelper.ENABLE_MIDDLEWARE = True
 
 
 class TeleBot(telebot.TeleBot):
-    current_user: User | None = None
+    first_reply_at: float | None = None
+
+    def __record_reply(self):
+        if self.first_reply_at is None:
+            self.first_reply_at = monotonic()
+            print(
+                "Time to first reply: "
+                f"{self.first_reply_at - STARTED_AT:.3f} s"
+            )
 
+    def send_message(self, *args, **kwargs):
+        result = super().send_message(*args, **kwargs)
+        self.__record_reply()
+        return result
+
+    def answer_inline_query(self, *args, **kwargs):
+        result = super().answer_inline_query(*args, **kwargs)
+        self.__record_reply()
+        return result
+
+
+load_dotenv()
 
-TIMETABLE_FILE = os.path.join(gettempdir(), "bot-timetable.xlsx")
+TIMETABLE_FILE = os.getenv("TIMETABLE_FILE") or os.path.join(
+    gettempdir(), "bot-timetable.xlsx"
+)
 
-db = sqlite3.connect("bot.db", check_same_thread=False)
+db = ThreadLocalConnection("bot.db")
 
 users = UsersRepository(db)
 settings = SettingsRepository(db)
-service = TimetableService(
-    TIMETABLE_FILE, users, settings.get_week_count_start
+# Set for worker processes, see dispatch()
+TIMETABLE_SNAPSHOT = os.getenv("TIMETABLE_SNAPSHOT")
+if TIMETABLE_SNAPSHOT:
+    service = TimetableService(
+        TIMETABLE_SNAPSHOT,
+        users,
+        settings.get_week_count_start,
+        MappedTimetableSnapshot,
+    )
+else:
+    service = TimetableService(
+        TIMETABLE_FILE, users, settings.get_week_count_start
+    )
+calendars = CalendarService(
+    service,
+    CalendarFilesRepository(db),
+    settings.get_week_count_start,
+    os.getenv("CALENDAR_CACHE_DIR") or TIMETABLE_FILE + ".calendars",
+    semester_weeks=int(os.getenv("SEMESTER_WEEKS", 18)),
 )
-updater = TimetableUpdaterService(TIMETABLE_FILE, settings)
-
-load_dotenv()
+refresh_scheduler = RefreshScheduler(
+    TimetableChecksRepository(db),
+    min_interval=timedelta(
+        seconds=int(os.getenv("REFRESH_MIN_INTERVAL", 2 * 60))
+    ),
+    max_interval=timedelta(
+        seconds=int(os.getenv("REFRESH_MAX_INTERVAL", 3 * 60 * 60))
+    ),
+    busy_interval=timedelta(
+        seconds=int(os.getenv("REFRESH_BUSY_INTERVAL", 5 * 60))
+    ),
+)
+updater = TimetableUpdaterService(TIMETABLE_FILE, settings, refresh_scheduler)
+# Shared by everything that messages many users at once, Telegram allows
+# about 30 messages per second in total
+bulk_send_limiter = RateLimiter(float(os.getenv("BULK_SEND_RATE", 25)))
+# Lets callback queries highlight phrases without a database query
+highlight_phrases_cache: LruCache[str] = LruCache(10000)
 
 # region Bot Initialization
 
+if os.getenv("BOT_API_URL"):
+    # E.g. a local Bot API server, or loadtest/fake_bot_api.py
+    telebot.apihelper.API_URL = os.getenv("BOT_API_URL") + "/bot{0}/{1}"
 bot = TeleBot(os.getenv("BOT_TOKEN"), parse_mode="HTML")
 ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")
 
@@ -47,18 +134,77 @@ class StateFilter(telebot.custom_filters.AdvancedCustomFilter):
 
     @staticmethod
     def check(message: telebot.types.Message, states: List[ConversationState]):
-        if hasattr(bot, "current_user") and bot.current_user:
-            return bot.current_user.conversation_state in states
-        print("Could not get field 'current_user' in bot")
+        user = getattr(message, "current_user", None)
+        if user:
+            return user.conversation_state in states
+        print("Could not get field 'current_user' in message")
         return False
 
 
-@bot.middleware_handler(update_types=["message"])
+def parse_rate_limit(value: str) -> TokenBucketLimiter:
+    # "<requests>/<seconds>", e.g. "10/10" allows bursts of 10 requests
+    # and one request per second on average
+    capacity, period = value.split("/")
+    return TokenBucketLimiter(float(capacity), float(period))
+
+
+RATE_LIMITS = {
+    "message": parse_rate_limit(os.getenv("RATE_LIMIT_MESSAGE", "10/10")),
+    # Clients send a query on almost every keystroke
+    "inline_query": parse_rate_limit(
+        os.getenv("RATE_LIMIT_INLINE_QUERY", "30/10")
+    ),
+    "callback_query": parse_rate_limit(
+        os.getenv("RATE_LIMIT_CALLBACK_QUERY", "10/10")
+    ),
+}
+
+
+# Runs before set_current_user, default middlewares run in the order they
+# are registered
+@bot.middleware_handler()
+def limit_rate(bot_instance: telebot.TeleBot, update: telebot.types.Update):
+    for update_type, limiter in RATE_LIMITS.items():
+        request = getattr(update, update_type)
+        if request is not None:
+            break
+    else:
+        return
+    if str(request.from_user.id) == ADMIN_CHAT_ID:
+        return
+    rejected = limiter.acquire(request.from_user.id)
+    if not rejected:
+        return
+    # Without its content the update is not passed to any handler
+    setattr(update, update_type, None)
+    if rejected > 1:
+        return
+    print(f"Rate limiting {update_type} from {request.from_user.id}")
+    try:
+        if update_type == "message":
+            bot_instance.reply_to(
+                request, "Слишком много запросов, подождите немного."
+            )
+        elif update_type == "callback_query":
+            bot_instance.answer_callback_query(
+                request.id, "Слишком много запросов, подождите немного."
+            )
+    except Exception as e:
+        print(f"Could not answer a rate limited request: {e}")
+
+
+@bot.middleware_handler()
 def set_current_user(
-    bot_instance: telebot.TeleBot, message: telebot.types.Message
+    bot_instance: telebot.TeleBot, update: telebot.types.Update
 ):
-    bot_instance.current_user = users.get_or_add_user_by_id(
-        message.from_user.id
+    message = update.message
+    if message is None:
+        return
+    # Kept on the message, middlewares run for a whole batch of updates
+    # before any of their handlers
+    message.current_user = users.get_or_add_user_by_id(message.from_user.id)
+    highlight_phrases_cache.put(
+        message.current_user.id, message.current_user.highlight_phrases
     )
 
 
@@ -66,6 +212,8 @@ TIMETABLE_COMMANDS = [
     telebot.types.BotCommand("week", "расписание на неделю"),
     telebot.types.BotCommand("today", "расписание на сегодня"),
     telebot.types.BotCommand("tomorrow", "расписание на завтра"),
+    telebot.types.BotCommand("ics", "расписание на семестр для календаря"),
+    telebot.types.BotCommand("digest", "присылать расписание каждый день"),
     telebot.types.BotCommand("setgroup", "поменять группу"),
     telebot.types.BotCommand("sethl", "изменить фразы для выделения"),
     telebot.types.BotCommand("cancel", "отменить действие"),
@@ -74,14 +222,36 @@ ADMIN_COMMANDS = TIMETABLE_COMMANDS + [
     telebot.types.BotCommand("settt", "Обновить ссылку на расписание."),
     telebot.types.BotCommand("setwcs", "Обновить дату начала отсчета недель."),
     telebot.types.BotCommand("update", "Обновить расписание."),
+    telebot.types.BotCommand("broadcast", "Написать всем пользователям."),
+    telebot.types.BotCommand("stats", "Статистика ограничения запросов."),
 ]
 bot.add_custom_filter(StateFilter())
-bot.set_my_commands(
-    commands=ADMIN_COMMANDS,
-    scope=telebot.types.BotCommandScopeChat(ADMIN_CHAT_ID),
+
+
+def send_bulk_message(chat_id: int, text: str):
+    try:
+        bot.send_message(chat_id, text)
+    except telebot.apihelper.ApiTelegramException as e:
+        if e.error_code == 429:
+            raise RetryAfterException(
+                e.result_json.get("parameters", {}).get("retry_after", 1)
+            )
+        # Blocked the bot, deactivated, or the chat no longer exists
+        if e.error_code == 403 or "chat not found" in e.description:
+            raise RecipientUnavailableException()
+        raise
+
+
+broadcaster = BroadcastService(
+    users, BroadcastsRepository(db), send_bulk_message, bulk_send_limiter
 )
-bot.set_my_commands(
-    commands=TIMETABLE_COMMANDS,
+digests = DigestService(
+    service,
+    users,
+    DigestsRepository(db),
+    send_bulk_message,
+    bulk_send_limiter,
+    window=float(os.getenv("DIGEST_WINDOW", 5 * 60)),
 )
 
 # endregion
@@ -89,11 +259,42 @@ bot.set_my_commands(
 # region Helper Functions
 
 
+def day_navigation_keyboard(
+    response: services.types.Message,
+) -> telebot.types.InlineKeyboardMarkup | None:
+    day = response.get_meta("day")
+    group = response.get_meta("group")
+    if not day or not group:
+        return None
+    current = date.fromisoformat(day)
+    previous = (current - timedelta(days=1)).isoformat()
+    following = (current + timedelta(days=1)).isoformat()
+    return telebot.types.InlineKeyboardMarkup(
+        [
+            [
+                telebot.types.InlineKeyboardButton(
+                    "◀", callback_data=f"day|{previous}|{group}"
+                ),
+                telebot.types.InlineKeyboardButton(
+                    "Сегодня", callback_data=f"day|today|{group}"
+                ),
+                telebot.types.InlineKeyboardButton(
+                    "▶", callback_data=f"day|{following}|{group}"
+                ),
+            ]
+        ]
+    )
+
+
 def reply_to_message(
     request: telebot.types.Message, response: services.types.Message
 ):
     if response.to == services.types.Recipient.SENDER:
-        bot.reply_to(request, response.text)
+        bot.reply_to(
+            request,
+            response.text,
+            reply_markup=day_navigation_keyboard(response),
+        )
     elif response.to == services.types.Recipient.ADMIN:
         bot.send_message(ADMIN_CHAT_ID, response.text)
     else:
@@ -110,13 +311,13 @@ def send_messages_as_reply_to(
         # When setting group, we guarantee that it won't throw
         # GroupNotFoundException
         send_messages_as_reply_to(
-            message, service.prompt_group(bot.current_user)
+            message, service.prompt_group(message.current_user)
         )
 
 
-def update_timetable():
+def update_timetable(force=False):
     try:
-        for message in updater.update_timetable():
+        for message in updater.update_timetable(force):
             bot.send_message(ADMIN_CHAT_ID, message.text)
     except Exception as e:
         bot.send_message(
@@ -126,6 +327,34 @@ def update_timetable():
         raise e
 
 
+def run_broadcast(broadcast: Broadcast):
+    try:
+        for message in broadcaster.run_broadcast(broadcast):
+            bot.send_message(ADMIN_CHAT_ID, message.text)
+    except Exception as e:
+        bot.send_message(
+            ADMIN_CHAT_ID,
+            f"Рассылка #{broadcast.id} прервана. Причина: {e}",
+        )
+        raise e
+
+
+def requires_timetable(handler):
+    # Until the first timetable is downloaded, answer with a cheap notice
+    # instead of trying to parse a file that does not exist yet.
+    @wraps(handler)
+    def wrapper(message: telebot.types.Message, *args, **kwargs):
+        if not service.is_ready():
+            bot.reply_to(
+                message,
+                "Расписание еще загружается. Попробуйте через минуту.",
+            )
+            return
+        return handler(message, *args, **kwargs)
+
+    return wrapper
+
+
 # endregion
 
 
@@ -140,13 +369,15 @@ def send_welcome(message: telebot.types.Message):
         "Я умею <s>только</s> отправлять расписание!\n"
         "Для того чтобы начать, мне нужна ваша группа.",
     )
-    send_messages_as_reply_to(message, service.prompt_group(bot.current_user))
+    send_messages_as_reply_to(
+        message, service.prompt_group(message.current_user)
+    )
 
 
 @bot.message_handler(commands=["cancel"])
 def exit_settings(message, react=True):
-    bot.current_user.conversation_state = ConversationState.IDLE
-    users.update_user(bot.current_user)
+    message.current_user.conversation_state = ConversationState.IDLE
+    users.update_user(message.current_user)
     if react:
         bot.set_message_reaction(
             message.chat.id,
@@ -159,8 +390,8 @@ def exit_settings(message, react=True):
     func=lambda m: str(m.chat.id) == ADMIN_CHAT_ID, commands=["settt"]
 )
 def set_timetable(message: telebot.types.Message):
-    bot.current_user.conversation_state = ConversationState.SETTING_LINK
-    users.update_user(bot.current_user)
+    message.current_user.conversation_state = ConversationState.SETTING_LINK
+    users.update_user(message.current_user)
     bot.reply_to(message, "Пришлите новую ссылку.")
 
 
@@ -174,11 +405,11 @@ def handle_set_timetable(message: telebot.types.Message):
         link = settings.get_timetable_link()
         try:
             settings.set_timetable_link(message.text)
-            update_timetable()
+            update_timetable(force=True)
             bot.reply_to(message, "Ссылка была обновлена.")
         except Exception as e:
             settings.set_timetable_link(link)
-            update_timetable()
+            update_timetable(force=True)
             bot.reply_to(message, f"Не удалось обновить ссылку. Причина: {e}")
     exit_settings(message, False)
 
@@ -187,10 +418,10 @@ def handle_set_timetable(message: telebot.types.Message):
     func=lambda m: str(m.chat.id) == ADMIN_CHAT_ID, commands=["setwcs"]
 )
 def set_week_count_start(message: telebot.types.Message):
-    bot.current_user.conversation_state = (
+    message.current_user.conversation_state = (
         ConversationState.SETTING_WEEK_COUNT_START
     )
-    users.update_user(bot.current_user)
+    users.update_user(message.current_user)
     bot.reply_to(message, "Пришлите дату начала отсчета недель.")
 
 
@@ -227,20 +458,90 @@ def update_timetable_command(message: telebot.types.Message):
     )
 
 
+@bot.message_handler(
+    func=lambda m: str(m.chat.id) == ADMIN_CHAT_ID, commands=["broadcast"]
+)
+def broadcast_command(message: telebot.types.Message):
+    if message.text.split()[1:] == ["cancel"]:
+        broadcast = broadcaster.cancel_broadcast()
+        bot.reply_to(
+            message,
+            (
+                f"Рассылка #{broadcast.id} отменена."
+                if broadcast
+                else "Незаконченных рассылок нет."
+            ),
+        )
+        return
+    message.current_user.conversation_state = (
+        ConversationState.SETTING_BROADCAST_TEXT
+    )
+    users.update_user(message.current_user)
+    bot.reply_to(
+        message,
+        "Пришлите сообщение для всех пользователей. Для отмены: /cancel.",
+    )
+
+
+@bot.message_handler(states=[ConversationState.SETTING_BROADCAST_TEXT])
+def handle_broadcast_text(message: telebot.types.Message):
+    if str(message.chat.id) != ADMIN_CHAT_ID:
+        bot.reply_to(
+            message, "У вас нет прав на это действие. (Вы как сюда попали?)"
+        )
+    else:
+        broadcast = broadcaster.start_broadcast(message.html_text)
+        if broadcast is None:
+            bot.reply_to(
+                message,
+                "Предыдущая рассылка еще не закончена. "
+                "Отменить ее: /broadcast cancel.",
+            )
+        else:
+            Thread(
+                target=run_broadcast, args=(broadcast,), daemon=True
+            ).start()
+    exit_settings(message, False)
+
+
+@bot.message_handler(
+    func=lambda m: str(m.chat.id) == ADMIN_CHAT_ID, commands=["stats"]
+)
+def rate_limit_stats(message: telebot.types.Message):
+    # Counted per process, so with --workers this is one worker's share
+    bot.reply_to(
+        message,
+        "Отклонено запросов:\n"
+        + "\n".join(
+            f"{update_type}: {limiter.rejected}, "
+            f"сейчас ограничено пользователей: {limiter.limited_keys()}"
+            for update_type, limiter in RATE_LIMITS.items()
+        ),
+    )
+
+
 @bot.message_handler(commands=["setgroup"])
 def set_user_group(message):
-    send_messages_as_reply_to(message, service.prompt_group(bot.current_user))
+    send_messages_as_reply_to(
+        message, service.prompt_group(message.current_user)
+    )
 
 
 @bot.message_handler(states=[ConversationState.SETTING_GROUP])
+@requires_timetable
 def handle_set_group(message: telebot.types.Message):
-    user = bot.current_user
-    group = message.text
-    tt = service.try_group(group)
-    if not tt:
+    user = message.current_user
+    group = service.resolve_group(message.text)
+    if not group:
+        suggestions = service.suggest_groups(message.text)
         bot.reply_to(
             message,
-            "Группа не была найдена в расписании. Попробуйте другую.",
+            "Группа не была найдена в расписании. "
+            + (
+                f"Возможно, вы имели в виду: {', '.join(suggestions)}?"
+                if suggestions
+                else "Попробуйте другую."
+            ),
         )
         return
     user.conversation_state = ConversationState.IDLE
@@ -254,6 +555,25 @@ def handle_set_group(message: telebot.types.Message):
     bot.reply_to(message, "Теперь можно получать расписание.")
 
 
+@bot.message_handler(commands=["digest"])
+def set_digest(message: telebot.types.Message):
+    if not message.current_user.group:
+        send_messages_as_reply_to(
+            message, service.prompt_group(message.current_user)
+        )
+        return
+    send_messages_as_reply_to(
+        message, digests.prompt_time(message.current_user)
+    )
+
+
+@bot.message_handler(states=[ConversationState.SETTING_DIGEST_TIME])
+def handle_set_digest(message: telebot.types.Message):
+    send_messages_as_reply_to(
+        message, digests.set_time(message.current_user, message.text)
+    )
+
+
 @bot.message_handler(commands=["sethl"])
 def set_hl(message):
     bot.reply_to(
@@ -261,28 +581,31 @@ def set_hl(message):
         "Пришлите фразы, "
         "которые нужно выделить в расписании, "
         "по одной на строке.\n\n"
-        f"Ваша группа ({bot.current_user.group}) выделяется всегда, "
+        f"Ваша группа ({message.current_user.group}) выделяется всегда, "
         "вне зависимости от заданных фраз.\n"
         + (
             "Кроме нее, также выделяются следующие фразы:"
-            if len(bot.current_user.highlight_phrases) > 0
+            if len(message.current_user.highlight_phrases) > 0
             else ""
         ),
     )
-    if len(bot.current_user.highlight_phrases) > 0:
-        bot.reply_to(message, bot.current_user.highlight_phrases)
-    bot.current_user.conversation_state = (
+    if len(message.current_user.highlight_phrases) > 0:
+        bot.reply_to(message, message.current_user.highlight_phrases)
+    message.current_user.conversation_state = (
         ConversationState.SETTING_HIGHLIGHT_PHRASES
     )
-    users.update_user(bot.current_user)
+    users.update_user(message.current_user)
 
 
 @bot.message_handler(states=[ConversationState.SETTING_HIGHLIGHT_PHRASES])
 def handle_set_hl(message: telebot.types.Message):
-    success = bot.current_user.try_set_highlight_phrases(message.text)
+    success = message.current_user.try_set_highlight_phrases(message.text)
     if success:
-        bot.current_user.conversation_state = ConversationState.IDLE
-        users.update_user(bot.current_user)
+        highlight_phrases_cache.put(
+            message.current_user.id, message.current_user.highlight_phrases
+        )
+        message.current_user.conversation_state = ConversationState.IDLE
+        users.update_user(message.current_user)
         bot.reply_to(message, "Фразы сохранены.")
     else:
         bot.reply_to(
@@ -293,47 +616,122 @@ def handle_set_hl(message: telebot.types.Message):
 
 
 @bot.message_handler(states=[ConversationState.IDLE], commands=["week"])
+@requires_timetable
 def timetable_week(message):
     send_messages_as_reply_to(
         message,
         service.timetable_range(
-            bot.current_user.group, 0, 7, bot.current_user.highlight_phrases
+            message.current_user.group,
+            0,
+            7,
+            message.current_user.highlight_phrases,
         ),
     )
 
 
 @bot.message_handler(states=[ConversationState.IDLE], commands=["today"])
+@requires_timetable
 def timetable_today(message):
     send_messages_as_reply_to(
         message,
         service.timetable_range(
-            bot.current_user.group, 0, 1, bot.current_user.highlight_phrases
+            message.current_user.group,
+            0,
+            1,
+            message.current_user.highlight_phrases,
         ),
     )
 
 
 @bot.message_handler(states=[ConversationState.IDLE], commands=["tomorrow"])
+@requires_timetable
 def timetable_tomorrow(message):
     send_messages_as_reply_to(
         message,
         service.timetable_range(
-            bot.current_user.group, 1, 1, bot.current_user.highlight_phrases
+            message.current_user.group,
+            1,
+            1,
+            message.current_user.highlight_phrases,
         ),
     )
 
 
+@bot.message_handler(states=[ConversationState.IDLE], commands=["ics"])
+@requires_timetable
+def timetable_calendar(message: telebot.types.Message):
+    try:
+        calendar = calendars.get_calendar(message.current_user.group)
+    except GroupNotFoundException:
+        send_messages_as_reply_to(
+            message, service.prompt_group(message.current_user)
+        )
+        return
+    if calendar is None:
+        bot.reply_to(message, "Дата начала семестра еще не задана.")
+        return
+    if calendar.file_id:
+        try:
+            bot.send_document(message.chat.id, calendar.file_id)
+            return
+        except telebot.apihelper.ApiTelegramException as e:
+            # E.g. the file was removed from Telegram servers
+            print(f"Could not resend calendar {calendar.file_id}: {e}")
+            calendars.forget_file_id(calendar)
+    with open(calendar.filename, "rb") as f:
+        sent = bot.send_document(
+            message.chat.id,
+            telebot.types.InputFile(f, f"{calendar.group}.ics"),
+        )
+    calendars.remember_file_id(calendar, sent.document.file_id)
+
+
 @bot.message_handler(states=[ConversationState.IDLE])
+@requires_timetable
 def handle_idle(message: telebot.types.Message):
     send_messages_as_reply_to(
         message,
         service.guess_request(
-            bot.current_user.group,
+            message.current_user.group,
             message.text,
-            bot.current_user.highlight_phrases,
+            message.current_user.highlight_phrases,
         ),
     )
 
 
+@bot.callback_query_handler(func=lambda c: (c.data or "").startswith("day|"))
+def navigate_day(call: telebot.types.CallbackQuery):
+    # Callback queries skip the user middleware, highlight phrases come
+    # from memory and the day itself from the render cache.
+    _, day, group = call.data.split("|", 2)
+    hp = highlight_phrases_cache.get(call.from_user.id)
+    if hp is None:
+        user = users.get_user_by_id(call.from_user.id)
+        hp = user.highlight_phrases if user is not None else ""
+        highlight_phrases_cache.put(call.from_user.id, hp)
+    try:
+        if day == "today":
+            messages = service.timetable_range(group, 0, 1, hp)
+        else:
+            d = date.fromisoformat(day)
+            messages = service.timetable_dates(group, d, d, hp)
+        response = next(iter(messages))
+        bot.edit_message_text(
+            response.text,
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=day_navigation_keyboard(response),
+        )
+        bot.answer_callback_query(call.id)
+    except GroupNotFoundException:
+        bot.answer_callback_query(call.id, "Группа не найдена в расписании.")
+    except telebot.apihelper.ApiTelegramException as e:
+        # E.g. "Today" pressed while today is already shown
+        if "message is not modified" not in e.description:
+            raise e
+        bot.answer_callback_query(call.id)
+
+
 @bot.message_handler(func=lambda m: True)
 def unknown_message(message: telebot.types.Message):
     bot.reply_to(message, "Вы нашли ошибку в боте !!!")
@@ -342,17 +740,32 @@ def unknown_message(message: telebot.types.Message):
 
 @bot.inline_handler(func=lambda q: True)
 def inline_request(inline_query: telebot.types.InlineQuery):
+    if not service.is_ready():
+        bot.answer_inline_query(inline_query.id, [], cache_time=0)
+        return
     user = users.get_user_by_id(inline_query.from_user.id)
     group = user.group if user is not None else None
     hp = user.highlight_phrases if user is not None else None
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
     results = []
+    has_more = False
     try:
-        for message in service.guess_everything(inline_query.query, group, hp):
+        # Only the requested page is rendered. Telegram asks for the next
+        # one with next_offset once the user scrolls down.
+        for message in islice(
+            service.guess_everything(inline_query.query, group, hp),
+            offset,
+            offset + INLINE_PAGE_SIZE + 1,
+        ):
+            if len(results) == INLINE_PAGE_SIZE:
+                has_more = True
+                break
             if message.to == services.types.Recipient.ADMIN:
                 bot.send_message(ADMIN_CHAT_ID, message.text)
                 continue
             if message.is_error:
                 results = []
+                has_more = False
                 break
             mid = md5(message.text.encode("utf-8")).hexdigest()
             group = message.get_meta("group") or "?"
@@ -372,11 +785,13 @@ def inline_request(inline_query: telebot.types.InlineQuery):
             )
     except GroupNotFoundException:
         results = []
+        has_more = False
     bot.answer_inline_query(
         inline_query.id,
         results,
         cache_time=60,
         is_personal=(user is not None),
+        next_offset=str(offset + INLINE_PAGE_SIZE) if has_more else "",
     )
 
 
@@ -384,14 +799,144 @@ def inline_request(inline_query: telebot.types.InlineQuery):
 
 
 def scheduler():
-    schedule.every(5).minutes.do(update_timetable)
     while True:
-        schedule.run_pending()
-        sleep(60)
+        # Wakes up exactly when the next check is due. The cap lets a
+        # forced update through /update reschedule the next check, in
+        # worker mode through the published snapshot.
+        sleep(min(max(updater.seconds_until_next_update(), 1), 60))
+        try:
+            update_timetable()
+        except Exception as e:
+            print(f"Could not update timetable: {e}")
 
 
-update_timetable()
+def publish_snapshots(publisher: SnapshotPublisher):
+    while True:
+        try:
+            if publisher.publish():
+                print("Published timetable snapshot")
+                # The workbook is only rewritten when it changed, also by
+                # a worker handling /update with its own scheduler
+                refresh_scheduler.reset_backoff()
+        except Exception as e:
+            print(f"Could not publish timetable snapshot: {e}")
+        sleep(1)
 
 
-Thread(target=scheduler, daemon=True).start()
-bot.infinity_polling()
+def startup(publisher: SnapshotPublisher | None = None):
+    # Runs alongside polling, so updates are accepted right away
+    try:
+        bot.set_my_commands(
+            commands=ADMIN_COMMANDS,
+            scope=telebot.types.BotCommandScopeChat(ADMIN_CHAT_ID),
+        )
+        bot.set_my_commands(
+            commands=TIMETABLE_COMMANDS,
+        )
+    except Exception as e:
+        print(f"Could not set bot commands: {e}")
+    try:
+        update_timetable()
+    except Exception as e:
+        print(f"Could not update timetable on startup: {e}")
+    if publisher:
+        # Workers may also download the timetable through /update, so the
+        # workbook is watched rather than published only after updates
+        Thread(
+            target=publish_snapshots, args=(publisher,), daemon=True
+        ).start()
+    elif service.is_ready():
+        service.warm_up()
+        print(f"Timetable ready in {monotonic() - STARTED_AT:.3f} s")
+    Thread(target=scheduler, daemon=True).start()
+    Thread(target=digests.run, daemon=True).start()
+    # Picks up a broadcast interrupted by a restart
+    broadcast = broadcaster.unfinished_broadcast()
+    if broadcast:
+        Thread(target=run_broadcast, args=(broadcast,), daemon=True).start()
+
+
+def update_partition(update: dict, workers: int) -> int:
+    # Updates from one user always go to the same worker, so they are
+    # handled in order
+    for kind in ("message", "inline_query", "callback_query"):
+        if kind in update and "from" in update[kind]:
+            return update[kind]["from"]["id"] % workers
+    return 0
+
+
+def worker(updates: multiprocessing.Queue):
+    while True:
+        try:
+            update = updates.get()
+        except (EOFError, OSError):
+            return  # Dispatcher is gone
+        try:
+            bot.process_new_updates([telebot.types.Update.de_json(update)])
+        except Exception as e:
+            print(f"Could not handle update: {e}")
+
+
+def start_worker(
+    context: multiprocessing.context.BaseContext,
+) -> Tuple[multiprocessing.Process, multiprocessing.Queue]:
+    updates = context.Queue(1000)
+    process = context.Process(target=worker, args=(updates,), daemon=True)
+    process.start()
+    return process, updates
+
+
+def dispatch(workers: int):
+    # The dispatcher polls Telegram, downloads the timetable and publishes
+    # it as a memory-mapped snapshot. Workers map the snapshot and handle
+    # the updates.
+    snapshot_file = TIMETABLE_FILE + ".snapshot"
+    os.environ["TIMETABLE_SNAPSHOT"] = snapshot_file
+    context = multiprocessing.get_context("spawn")
+    processes, queues = [], []
+    for _ in range(workers):
+        process, updates = start_worker(context)
+        processes.append(process)
+        queues.append(updates)
+    publisher = SnapshotPublisher(TIMETABLE_FILE, snapshot_file)
+    Thread(target=startup, args=(publisher,), daemon=True).start()
+    offset = None
+    while True:
+        try:
+            updates = telebot.apihelper.get_updates(
+                bot.token, offset, timeout=25, long_polling_timeout=20
+            )
+        except Exception as e:
+            print(f"Could not get updates: {e}")
+            sleep(1)
+            continue
+        for i, process in enumerate(processes):
+            if not process.is_alive():
+                # Updates left in its queue are lost with it
+                print(f"Worker {i} exited ({process.exitcode}), restarting")
+                processes[i], queues[i] = start_worker(context)
+        for update in updates:
+            offset = update["update_id"] + 1
+            i = update_partition(update, workers)
+            try:
+                # A full queue means a stuck worker, which must not hold up
+                # the other partitions
+                queues[i].put_nowait(update)
+            except Full:
+                print(f"Worker {i} is stuck, dropped update {offset - 1}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Timetable Telegram bot.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes handling updates.",
+    )
+    args = parser.parse_args()
+    if args.workers > 1:
+        dispatch(args.workers)
+    else:
+        Thread(target=startup, daemon=True).start()
+        bot.infinity_polling()
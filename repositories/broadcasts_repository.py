@@ -0,0 +1,81 @@
+from domain.broadcast import Broadcast
+from domain.limits import TELEGRAM_MESSAGE_LEN
+from sqlite3 import Connection
+
+
+class BroadcastsRepository:
+    def __init__(self, db: Connection, remove_db=False):
+        self.__db = db
+        cur = db.cursor()
+        if remove_db:
+            cur.execute('DROP TABLE IF EXISTS "broadcasts"')
+        cur.execute(f"""
+CREATE TABLE IF NOT EXISTS "broadcasts" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "text" VARCHAR({TELEGRAM_MESSAGE_LEN}) NOT NULL,
+    "last_user_id" BIGINT NOT NULL DEFAULT 0,
+    "sent" INTEGER NOT NULL DEFAULT 0,
+    "failed" INTEGER NOT NULL DEFAULT 0,
+    "removed" INTEGER NOT NULL DEFAULT 0,
+    "finished" BOOLEAN NOT NULL DEFAULT FALSE
+)""")
+        db.commit()
+
+    @staticmethod
+    def __from_row(row) -> Broadcast:
+        bid, text, last_user_id, sent, failed, removed, finished = row
+        broadcast = Broadcast(bid, text)
+        broadcast.last_user_id = last_user_id
+        broadcast.sent = sent
+        broadcast.failed = failed
+        broadcast.removed = removed
+        broadcast.finished = bool(finished)
+        return broadcast
+
+    def add_broadcast(self, text: str) -> Broadcast:
+        cur = self.__db.cursor()
+        res = cur.execute(
+            'INSERT INTO "broadcasts"("text") VALUES (?) RETURNING *', (text,)
+        )
+        row = res.fetchone()
+        self.__db.commit()
+        return self.__from_row(row)
+
+    def get_unfinished_broadcast(self) -> Broadcast | None:
+        cur = self.__db.cursor()
+        res = cur.execute(
+            'SELECT * FROM "broadcasts" WHERE NOT "finished" '
+            'ORDER BY "id" LIMIT 1'
+        )
+        row = res.fetchone()
+        return self.__from_row(row) if row else None
+
+    def get_broadcast(self, broadcast_id: int) -> Broadcast | None:
+        cur = self.__db.cursor()
+        res = cur.execute(
+            'SELECT * FROM "broadcasts" WHERE "id" = ?', (broadcast_id,)
+        )
+        row = res.fetchone()
+        return self.__from_row(row) if row else None
+
+    def update_broadcast(self, broadcast: Broadcast) -> None:
+        # A cancelled broadcast stays finished
+        cur = self.__db.cursor()
+        cur.execute(
+            'UPDATE "broadcasts" '
+            'SET "last_user_id" = ?, '
+            '"sent" = ?, '
+            '"failed" = ?, '
+            '"removed" = ?, '
+            '"finished" = "finished" OR ? '
+            'WHERE "id" = ?',
+            (
+                broadcast.last_user_id,
+                broadcast.sent,
+                broadcast.failed,
+                broadcast.removed,
+                broadcast.finished,
+                broadcast.id,
+            ),
+        )
+        self.__db.commit()
@@ -0,0 +1,44 @@
+from sqlite3 import Connection
+
+
+class CalendarFilesRepository:
+    # Telegram file_id of every uploaded calendar, so that the same file is
+    # not uploaded again
+    def __init__(self, db: Connection, remove_db=False):
+        self.__db = db
+        cur = db.cursor()
+        if remove_db:
+            cur.execute('DROP TABLE IF EXISTS "calendar_files"')
+        cur.execute(
+            """
+CREATE TABLE IF NOT EXISTS "calendar_files" (
+    "group" VARCHAR(10) PRIMARY KEY,
+    "key" VARCHAR(64) NOT NULL,
+    "file_id" VARCHAR(256) NOT NULL
+)"""
+        )
+        db.commit()
+
+    def get_file_id(self, group: str, key: str) -> str | None:
+        cur = self.__db.cursor()
+        res = cur.execute(
+            'SELECT "file_id" FROM "calendar_files" '
+            'WHERE "group" = ? AND "key" = ?',
+            (group, key),
+        )
+        row = res.fetchone()
+        return row[0] if row else None
+
+    def set_file_id(self, group: str, key: str, file_id: str) -> None:
+        # Only the latest calendar of a group is kept
+        cur = self.__db.cursor()
+        cur.execute(
+            'INSERT OR REPLACE INTO "calendar_files" VALUES (?, ?, ?)',
+            (group, key, file_id),
+        )
+        self.__db.commit()
+
+    def remove_file_id(self, group: str) -> None:
+        cur = self.__db.cursor()
+        cur.execute('DELETE FROM "calendar_files" WHERE "group" = ?', (group,))
+        self.__db.commit()
@@ -0,0 +1,30 @@
+from threading import local
+import sqlite3
+
+
+class ThreadLocalConnection:
+    # A connection shared by threads lets one thread write inside another
+    # thread's unfinished read, which fails once other processes write to
+    # the same file. So every thread gets its own connection.
+    def __init__(self, database: str):
+        self.__database = database
+        self.__local = local()
+
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.__database)
+            # Readers do not block writers, which matters with several
+            # worker processes
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.__local.connection = connection
+        return connection
+
+    def cursor(self) -> sqlite3.Cursor:
+        return self.__connection().cursor()
+
+    def execute(self, *args) -> sqlite3.Cursor:
+        return self.__connection().execute(*args)
+
+    def commit(self) -> None:
+        self.__connection().commit()
@@ -0,0 +1,77 @@
+from sqlite3 import Connection
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+
+class DigestsRepository:
+    # Users who asked for their timetable every day, at a local time given
+    # in minutes since midnight
+    def __init__(self, db: Connection, remove_db=False):
+        self.__db = db
+        cur = db.cursor()
+        if remove_db:
+            cur.execute('DROP TABLE IF EXISTS "digests"')
+            cur.execute('DROP TABLE IF EXISTS "digests_prepared"')
+        cur.execute("""
+CREATE TABLE IF NOT EXISTS "digests" (
+    "user_id" BIGINT PRIMARY KEY,
+    "time" INTEGER NOT NULL
+)""")
+        cur.execute(
+            'CREATE INDEX IF NOT EXISTS "digests_time" ON "digests"("time")'
+        )
+        # The last minute whose digests were prepared, a single row
+        cur.execute("""
+CREATE TABLE IF NOT EXISTS "digests_prepared" (
+    "prepared_at" INTEGER NOT NULL
+)""")
+        db.commit()
+
+    def get_digest_time(self, user_id: int) -> int | None:
+        cur = self.__db.cursor()
+        res = cur.execute(
+            'SELECT "time" FROM "digests" WHERE "user_id" = ?', (user_id,)
+        )
+        row = res.fetchone()
+        return row[0] if row else None
+
+    def set_digest_time(self, user_id: int, minutes: int) -> None:
+        cur = self.__db.cursor()
+        cur.execute(
+            'INSERT OR REPLACE INTO "digests" VALUES (?, ?)',
+            (user_id, minutes),
+        )
+        self.__db.commit()
+
+    def remove_digest(self, user_id: int) -> None:
+        cur = self.__db.cursor()
+        cur.execute('DELETE FROM "digests" WHERE "user_id" = ?', (user_id,))
+        self.__db.commit()
+
+    def get_subscribers_at(self, minutes: int) -> List[Tuple[int, str, str]]:
+        # (user id, group, highlight phrases) of users with a group
+        cur = self.__db.cursor()
+        res = cur.execute(
+            'SELECT "users"."id", "users"."group", '
+            '"users"."highlight_phrases" '
+            'FROM "digests" '
+            'JOIN "users" ON "users"."id" = "digests"."user_id" '
+            'WHERE "digests"."time" = ? AND "users"."group" != \'\'',
+            (minutes,),
+        )
+        return res.fetchall()
+
+    def get_prepared_at(self) -> datetime | None:
+        cur = self.__db.cursor()
+        res = cur.execute('SELECT "prepared_at" FROM "digests_prepared"')
+        row = res.fetchone()
+        return datetime.fromtimestamp(row[0], timezone.utc) if row else None
+
+    def set_prepared_at(self, at: datetime) -> None:
+        cur = self.__db.cursor()
+        cur.execute('DELETE FROM "digests_prepared"')
+        cur.execute(
+            'INSERT INTO "digests_prepared" VALUES (?)',
+            (int(at.timestamp()),),
+        )
+        self.__db.commit()
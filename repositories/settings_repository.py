@@ -17,7 +17,7 @@ CREATE TABLE IF NOT EXISTS "settings" (
         )
         cur.executemany(
             'INSERT OR IGNORE INTO "settings" VALUES (?, ?)',
-            [("link", ""), ("week_count_start", "")],
+            [("link", ""), ("week_count_start", ""), ("timetable_hash", "")],
         )
         db.commit()
 
@@ -54,3 +54,9 @@ CREATE TABLE IF NOT EXISTS "settings" (
 
     def set_week_count_start(self, start: date) -> None:
         self.__set_value("week_count_start", start.isoformat())
+
+    def get_timetable_hash(self) -> str:
+        return self.__get_value("timetable_hash") or ""
+
+    def set_timetable_hash(self, content_hash: str) -> None:
+        self.__set_value("timetable_hash", content_hash)
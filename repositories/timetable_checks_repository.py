@@ -0,0 +1,47 @@
+from sqlite3 import Connection
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+
+class TimetableChecksRepository:
+    def __init__(self, db: Connection, remove_db=False):
+        self.__db = db
+        cur = db.cursor()
+        if remove_db:
+            cur.execute('DROP TABLE IF EXISTS "timetable_checks"')
+        cur.execute(
+            """
+CREATE TABLE IF NOT EXISTS "timetable_checks" (
+    "checked_at" INTEGER NOT NULL,
+    "changed" BOOLEAN NOT NULL
+)"""
+        )
+        db.commit()
+
+    def add_check(self, at: datetime, changed: bool) -> None:
+        cur = self.__db.cursor()
+        cur.execute(
+            'INSERT INTO "timetable_checks" VALUES (?, ?)',
+            (int(at.timestamp()), changed),
+        )
+        self.__db.commit()
+
+    def get_checks_since(self, since: datetime) -> List[Tuple[datetime, bool]]:
+        cur = self.__db.cursor()
+        res = cur.execute(
+            'SELECT "checked_at", "changed" FROM "timetable_checks" '
+            'WHERE "checked_at" >= ? ORDER BY "checked_at"',
+            (int(since.timestamp()),),
+        )
+        return [
+            (datetime.fromtimestamp(ts, timezone.utc), bool(changed))
+            for (ts, changed) in res.fetchall()
+        ]
+
+    def remove_checks_before(self, before: datetime) -> None:
+        cur = self.__db.cursor()
+        cur.execute(
+            'DELETE FROM "timetable_checks" WHERE "checked_at" < ?',
+            (int(before.timestamp()),),
+        )
+        self.__db.commit()
@@ -1,6 +1,7 @@
 from domain.user import User, ConversationState
 from domain.limits import USER_HIGHLIGHT_PHRASES_LEN
 from sqlite3 import Connection
+from typing import Iterator
 
 
 class UsersRepository:
@@ -70,3 +71,31 @@ CREATE TABLE IF NOT EXISTS "users" (
             ),
         )
         self.__db.commit()
+
+    def iter_user_ids(self, after: int = 0, chunk_size=500) -> Iterator[int]:
+        # Reads the ids in short chunks ordered by id, so neither the whole
+        # table nor a read transaction is held while the caller works
+        cur = self.__db.cursor()
+        while True:
+            res = cur.execute(
+                'SELECT "id" FROM "users" WHERE "id" > ? '
+                'ORDER BY "id" LIMIT ?',
+                (after, chunk_size),
+            )
+            chunk = [row[0] for row in res.fetchall()]
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            after = chunk[-1]
+
+    def count_users_after(self, after: int = 0) -> int:
+        cur = self.__db.cursor()
+        res = cur.execute(
+            'SELECT COUNT(*) FROM "users" WHERE "id" > ?', (after,)
+        )
+        return res.fetchone()[0]
+
+    def remove_user(self, user_id: int) -> None:
+        cur = self.__db.cursor()
+        cur.execute('DELETE FROM "users" WHERE "id" = ?', (user_id,))
+        self.__db.commit()
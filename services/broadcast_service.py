@@ -0,0 +1,117 @@
+from domain.broadcast import Broadcast
+from repositories.broadcasts_repository import BroadcastsRepository
+from repositories.users_repository import UsersRepository
+from services.delivery import Delivery, deliver
+from services.rate_limiter import RateLimiter
+from services.types import Message, Recipient
+from threading import Lock
+from time import monotonic
+from typing import Callable, Iterator
+
+
+class BroadcastService:
+    def __init__(
+        self,
+        users_repository: UsersRepository,
+        broadcasts_repository: BroadcastsRepository,
+        send: Callable[[int, str], None],
+        limiter: RateLimiter,
+        chunk_size: int = 500,
+        checkpoint_every: int = 50,
+        progress_interval: float = 60.0,
+    ):
+        self.__users = users_repository
+        self.__broadcasts = broadcasts_repository
+        self.__send = send
+        self.__limiter = limiter
+        self.__chunk_size = chunk_size
+        self.__checkpoint_every = checkpoint_every
+        self.__progress_interval = progress_interval
+        self.__lock = Lock()
+
+    def start_broadcast(self, text: str) -> Broadcast | None:
+        # Only one broadcast at a time, the running one may be in another
+        # process, so the database decides
+        with self.__lock:
+            if self.__broadcasts.get_unfinished_broadcast():
+                return None
+            return self.__broadcasts.add_broadcast(text)
+
+    def unfinished_broadcast(self) -> Broadcast | None:
+        return self.__broadcasts.get_unfinished_broadcast()
+
+    def cancel_broadcast(self) -> Broadcast | None:
+        # A running broadcast stops at its next checkpoint, wherever it runs
+        with self.__lock:
+            broadcast = self.__broadcasts.get_unfinished_broadcast()
+            if broadcast is not None:
+                broadcast.finished = True
+                self.__broadcasts.update_broadcast(broadcast)
+            return broadcast
+
+    def __is_cancelled(self, broadcast: Broadcast) -> bool:
+        saved = self.__broadcasts.get_broadcast(broadcast.id)
+        return saved is None or saved.finished
+
+    def __deliver(self, broadcast: Broadcast, user_id: int):
+        result = deliver(self.__send, self.__limiter, user_id, broadcast.text)
+        if result == Delivery.SENT:
+            broadcast.sent += 1
+        elif result == Delivery.UNAVAILABLE:
+            self.__users.remove_user(user_id)
+            broadcast.removed += 1
+        else:
+            broadcast.failed += 1
+
+    def __progress(self, broadcast: Broadcast) -> str:
+        return (
+            f"Доставлено: {broadcast.sent}, "
+            f"не доставлено: {broadcast.failed}, "
+            f"удалено заблокировавших бота: {broadcast.removed}"
+        )
+
+    def run_broadcast(self, broadcast: Broadcast) -> Iterator[Message]:
+        # A checkpoint is saved every few messages, so after a restart at
+        # most that many users get the message twice
+        left = self.__users.count_users_after(broadcast.last_user_id)
+        yield Message(
+            f"Рассылка #{broadcast.id} "
+            + ("продолжена" if broadcast.last_user_id else "начата")
+            + f", осталось пользователей: {left}.",
+            Recipient.ADMIN,
+        )
+        reported_at = monotonic()
+        handled = 0
+        for user_id in self.__users.iter_user_ids(
+            broadcast.last_user_id, self.__chunk_size
+        ):
+            self.__deliver(broadcast, user_id)
+            broadcast.last_user_id = user_id
+            handled += 1
+            if handled % self.__checkpoint_every == 0:
+                self.__broadcasts.update_broadcast(broadcast)
+                if self.__is_cancelled(broadcast):
+                    yield Message(
+                        f"Рассылка #{broadcast.id} отменена. "
+                        + self.__progress(broadcast)
+                        + ".",
+                        Recipient.ADMIN,
+                    )
+                    return
+            if monotonic() - reported_at >= self.__progress_interval:
+                reported_at = monotonic()
+                left = self.__users.count_users_after(user_id)
+                yield Message(
+                    f"Рассылка #{broadcast.id}: "
+                    + self.__progress(broadcast)
+                    + f", осталось: {left}.",
+                    Recipient.ADMIN,
+                )
+        broadcast.finished = True
+        self.__broadcasts.update_broadcast(broadcast)
+        yield Message(
+            f"Рассылка #{broadcast.id} завершена. "
+            + self.__progress(broadcast)
+            + ".",
+            Recipient.ADMIN,
+        )
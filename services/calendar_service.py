@@ -0,0 +1,105 @@
+from datetime import date
+from domain.ical import timetable_to_ical
+from hashlib import md5
+from repositories.calendar_files_repository import CalendarFilesRepository
+from services.timetable_service import (
+    GroupNotFoundException,
+    TimetableService,
+)
+from threading import Lock
+from typing import Callable
+import glob
+import os
+import re
+
+
+class CalendarFile:
+    def __init__(self, group: str, key: str, filename: str, file_id: str):
+        self.__group = group
+        self.__key = key
+        self.__filename = filename
+        self.__file_id = file_id
+
+    @property
+    def group(self) -> str:
+        return self.__group
+
+    @property
+    def key(self) -> str:
+        # Changes with the group's timetable, the start of the semester and
+        # its length
+        return self.__key
+
+    @property
+    def filename(self) -> str:
+        return self.__filename
+
+    @property
+    def file_id(self) -> str | None:
+        return self.__file_id
+
+
+class CalendarService:
+    def __init__(
+        self,
+        timetable_service: TimetableService,
+        calendar_files_repository: CalendarFilesRepository,
+        week_count_start_generator: Callable[[], date],
+        cache_dir: str,
+        semester_weeks: int = 18,
+    ):
+        self.__timetables = timetable_service
+        self.__files = calendar_files_repository
+        self.__week_count_start_generator = week_count_start_generator
+        self.__cache_dir = cache_dir
+        self.__semester_weeks = semester_weeks
+        self.__lock = Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_calendar(self, group: str) -> CalendarFile | None:
+        # None until the start of the semester is set
+        week_count_start = self.__week_count_start_generator()
+        if week_count_start is None:
+            return None
+        # The same group may be typed in different ways, the cached file
+        # is kept under its name from the timetable
+        group = self.__timetables.resolve_group(group)
+        if group is None:
+            raise GroupNotFoundException()
+        _, tt = self.__timetables.get_timetable(group)
+        # Made from the group's own lessons, not from the version of the
+        # loaded file, so that it stays the same after restarts and in
+        # every worker, and calendars of unchanged groups are kept
+        content = [
+            (day.weekday, [(row.time, row.lessons) for row in day.timetable])
+            for day in tt.timetable
+        ]
+        key = md5(
+            repr((content, week_count_start, self.__semester_weeks)).encode()
+        ).hexdigest()
+        safe_group = re.sub(r"[^\w-]", "_", group)
+        filename = os.path.join(self.__cache_dir, f"{safe_group}-{key}.ics")
+        with self.__lock:
+            if not os.path.exists(filename):
+                # Calendars made for the previous timetables are not needed
+                for old in glob.glob(
+                    os.path.join(self.__cache_dir, f"{safe_group}-*.ics")
+                ):
+                    os.remove(old)
+                tmp_filename = filename + ".part"
+                with open(tmp_filename, "wb") as f:
+                    f.write(
+                        timetable_to_ical(
+                            group, tt, week_count_start, self.__semester_weeks
+                        )
+                    )
+                os.replace(tmp_filename, filename)
+        return CalendarFile(
+            group, key, filename, self.__files.get_file_id(group, key)
+        )
+
+    def remember_file_id(self, calendar: CalendarFile, file_id: str) -> None:
+        self.__files.set_file_id(calendar.group, calendar.key, file_id)
+
+    def forget_file_id(self, calendar: CalendarFile) -> None:
+        self.__files.remove_file_id(calendar.group)
@@ -0,0 +1,47 @@
+from enum import Enum
+from services.rate_limiter import RateLimiter
+from typing import Callable
+
+
+class RecipientUnavailableException(Exception):
+    # The user blocked the bot or deleted the account
+    def __init__(self):
+        super(RecipientUnavailableException, self).__init__(
+            "Recipient is unavailable."
+        )
+
+
+class RetryAfterException(Exception):
+    def __init__(self, seconds: float):
+        super(RetryAfterException, self).__init__(f"Retry after {seconds} s.")
+        self.seconds = seconds
+
+
+class Delivery(Enum):
+    SENT = 1
+    UNAVAILABLE = 2
+    FAILED = 3
+
+
+def deliver(
+    send: Callable[[int, str], None],
+    limiter: RateLimiter,
+    chat_id: int,
+    text: str,
+) -> Delivery:
+    # For messages nobody asked for right now, e.g. broadcasts, sent
+    # within the limits shared by all of them
+    while True:
+        limiter.acquire()
+        try:
+            send(chat_id, text)
+            return Delivery.SENT
+        except RetryAfterException as e:
+            # Everyone sharing the limiter waits, then the same chat is
+            # tried again
+            limiter.pause(e.seconds)
+        except RecipientUnavailableException:
+            return Delivery.UNAVAILABLE
+        except Exception as e:
+            print(f"Could not send message to {chat_id}: {e}")
+            return Delivery.FAILED
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+from domain.user import ConversationState, User
+from heapq import heappop, heappush
+from repositories.digests_repository import DigestsRepository
+from repositories.users_repository import UsersRepository
+from services.delivery import Delivery, deliver
+from services.rate_limiter import RateLimiter
+from services.timetable_service import (
+    GroupNotFoundException,
+    TimetableService,
+)
+from services.types import Message
+from threading import Condition, Thread
+from time import sleep, time
+from typing import Callable, Dict, Iterator, List, Tuple
+import re
+
+LOCAL_OFFSET = timedelta(hours=3)
+# Digests from this hour on are about the next day
+EVENING_HOUR = 18
+# Minutes missed while the bot was down are not sent later than this
+MAX_CATCH_UP = timedelta(minutes=10)
+
+
+class DigestService:
+    def __init__(
+        self,
+        timetable_service: TimetableService,
+        users_repository: UsersRepository,
+        digests_repository: DigestsRepository,
+        send: Callable[[int, str], None],
+        limiter: RateLimiter,
+        window: float = 300.0,
+        lead: float = 60.0,
+    ):
+        self.__timetables = timetable_service
+        self.__users = users_repository
+        self.__digests = digests_repository
+        self.__send = send
+        self.__limiter = limiter
+        self.__window = window
+        self.__lead = timedelta(seconds=lead)
+        # (send at, number, chat id, text), texts are shared by a batch
+        self.__queue: List[Tuple[float, int, int, str]] = []
+        self.__queued = 0
+        self.__queue_cond = Condition()
+        self.__prepared = digests_repository.get_prepared_at()
+
+    def prompt_time(self, user: User) -> Iterator[Message]:
+        user.conversation_state = ConversationState.SETTING_DIGEST_TIME
+        self.__users.update_user(user)
+        minutes = self.__digests.get_digest_time(user.id)
+        current = (
+            f"Сейчас расписание приходит в {minutes // 60}:{minutes % 60:02}."
+            if minutes is not None
+            else "Сейчас расписание не присылается."
+        )
+        yield Message(
+            "Пришлите время, в которое каждый день присылать расписание, "
+            "например 7:30, или «выкл», чтобы не присылать.\n"
+            f"С {EVENING_HOUR}:00 присылается расписание на следующий день.\n"
+            + current,
+            is_error=True,
+        )
+
+    def set_time(self, user: User, text: str) -> Iterator[Message]:
+        if re.match(r"^\s*(выкл|нет|off)\w*\s*$", text, re.IGNORECASE):
+            self.__digests.remove_digest(user.id)
+            reply = "Расписание больше не будет присылаться."
+        else:
+            time_match = re.match(r"^\s*(\d{1,2})[:.](\d{2})\s*$", text)
+            if not time_match:
+                yield Message(
+                    "Не удалось распознать время. Пример: 7:30.",
+                    is_error=True,
+                )
+                return
+            hours, minutes = map(int, time_match.groups())
+            if hours > 23 or minutes > 59:
+                yield Message("Такого времени не существует.", is_error=True)
+                return
+            self.__digests.set_digest_time(user.id, hours * 60 + minutes)
+            reply = (
+                f"Расписание будет присылаться каждый день в "
+                f"{hours}:{minutes:02}."
+            )
+        user.conversation_state = ConversationState.IDLE
+        self.__users.update_user(user)
+        yield Message(reply)
+
+    def prepare(self, at: datetime) -> int:
+        # Renders the digests due at the given minute once per (group,
+        # highlight phrases) and queues them spread over the window.
+        # Returns the number of queued messages.
+        local = at + LOCAL_OFFSET
+        day = local.date()
+        if local.hour >= EVENING_HOUR:
+            day += timedelta(days=1)
+        batches: Dict[Tuple[str, str], List[int]] = {}
+        for user_id, group, hp in self.__digests.get_subscribers_at(
+            local.hour * 60 + local.minute
+        ):
+            batches.setdefault((group, hp), []).append(user_id)
+        jobs: List[Tuple[int, str]] = []
+        for (group, hp), user_ids in batches.items():
+            try:
+                message = next(
+                    iter(
+                        self.__timetables.timetable_dates(group, day, day, hp)
+                    )
+                )
+            except GroupNotFoundException:
+                continue
+            if message.get_meta("lessons") == "0":
+                continue  # Nothing to remind about
+            jobs += [(user_id, message.text) for user_id in user_ids]
+        if not jobs:
+            return 0
+        step = self.__window / len(jobs)
+        with self.__queue_cond:
+            for i, (user_id, text) in enumerate(jobs):
+                heappush(
+                    self.__queue,
+                    (at.timestamp() + i * step, self.__queued, user_id, text),
+                )
+                self.__queued += 1
+            self.__queue_cond.notify()
+        return len(jobs)
+
+    def __send_loop(self):
+        while True:
+            with self.__queue_cond:
+                # A new batch may be due earlier than the rest of the
+                # previous one, so the head of the queue is checked again
+                # after every push
+                while not self.__queue or self.__queue[0][0] > time():
+                    self.__queue_cond.wait(
+                        self.__queue[0][0] - time() if self.__queue else None
+                    )
+                _, _, user_id, text = heappop(self.__queue)
+            result = deliver(self.__send, self.__limiter, user_id, text)
+            if result == Delivery.UNAVAILABLE:
+                self.__digests.remove_digest(user_id)
+                self.__users.remove_user(user_id)
+
+    def prepare_due(self, now: datetime) -> None:
+        # Prepared a bit ahead, so that sending starts on time
+        due = (now + self.__lead).replace(second=0, microsecond=0)
+        if self.__prepared is None:
+            # Digests of the current minute may already have been sent
+            self.__prepared = now.replace(second=0, microsecond=0)
+        # Resumes after the minute prepared last, also after a restart
+        prepared = max(self.__prepared, due - MAX_CATCH_UP)
+        while prepared < due:
+            prepared += timedelta(minutes=1)
+            try:
+                queued = self.prepare(prepared)
+                if queued:
+                    print(f"Queued {queued} digests for {prepared}")
+            except Exception as e:
+                print(f"Could not prepare digests for {prepared}: {e}")
+            self.__digests.set_prepared_at(prepared)
+        self.__prepared = prepared
+
+    def run(self):
+        Thread(target=self.__send_loop, daemon=True).start()
+        while True:
+            self.prepare_due(datetime.now(timezone.utc))
+            sleep(1)
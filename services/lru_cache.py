@@ -0,0 +1,34 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class LruCache(Generic[T]):
+    # Keeps at most `size` least recently used values
+    def __init__(self, size: int):
+        self.__size = size
+        self.__lock = Lock()
+        self.__values: OrderedDict[Hashable, T] = OrderedDict()
+
+    def get(self, key: Hashable) -> T | None:
+        with self.__lock:
+            value = self.__values.get(key)
+            if value is not None:
+                self.__values.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: T) -> None:
+        with self.__lock:
+            self.__values[key] = value
+            self.__values.move_to_end(key)
+            if len(self.__values) > self.__size:
+                self.__values.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], T]) -> T:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
@@ -0,0 +1,24 @@
+from threading import Lock
+from time import monotonic, sleep
+
+
+class RateLimiter:
+    # Spaces calls evenly so that all threads sharing the limiter together
+    # make at most `rate` calls per second
+    def __init__(self, rate: float):
+        self.__interval = 1 / rate
+        self.__lock = Lock()
+        self.__next_at = monotonic()
+
+    def acquire(self):
+        with self.__lock:
+            now = monotonic()
+            at = max(now, self.__next_at)
+            self.__next_at = at + self.__interval
+        if at > now:
+            sleep(at - now)
+
+    def pause(self, seconds: float):
+        # E.g. after Telegram answered with "Too Many Requests"
+        with self.__lock:
+            self.__next_at = max(self.__next_at, monotonic() + seconds)
@@ -0,0 +1,164 @@
+from repositories.timetable_checks_repository import (
+    TimetableChecksRepository,
+)
+from datetime import date, datetime, time, timedelta, timezone
+from threading import Lock
+from typing import List
+
+LOCAL_OFFSET = timedelta(hours=3)
+# Hours in which the sheet changed on at least this share of days back
+# off only up to the busy interval
+CHANGE_THRESHOLD = 0.25
+
+
+def prior_change_likelihood(hour: int) -> float:
+    # Used while there is little history. With the default intervals the
+    # longest intervals are the old fixed ones: 3 hours at night,
+    # 5 minutes during work time and 30 minutes in the evening.
+    if hour in range(0, 7):
+        # Night time, modifications are unlikely
+        return 0.0
+    elif hour in range(7, 18):
+        # Work time, modifications are likely to be made in this time range
+        return 0.98
+    else:  # 18 - 24
+        # Evening, modifications can happen but not as likely
+        return 0.125
+
+
+class RefreshScheduler:
+    def __init__(
+        self,
+        checks_repository: TimetableChecksRepository,
+        min_interval: timedelta = timedelta(minutes=2),
+        max_interval: timedelta = timedelta(hours=3),
+        busy_interval: timedelta = timedelta(minutes=5),
+        history: timedelta = timedelta(days=28),
+        prior_weight: float = 7.0,
+    ):
+        self.__checks = checks_repository
+        self.__min_interval = min_interval
+        self.__busy_interval = max(busy_interval, min_interval)
+        self.__max_interval = max(max_interval, self.__busy_interval)
+        self.__history = history
+        self.__prior_weight = prior_weight
+        self.__lock = Lock()
+        self.__last_check = datetime.fromtimestamp(0, timezone.utc)
+        self.__unchanged_checks = 0
+        self.__failures = 0
+        self.__learned_on: date | None = None
+        self.__likelihood = [0.0] * 24
+        self.__relearn(datetime.now(timezone.utc))
+
+    def __relearn(self, now: datetime):
+        # Once a local day, from complete days only: a day that has just
+        # begun would count its first hours as observed without changes
+        today = (now + LOCAL_OFFSET).date()
+        if today == self.__learned_on:
+            return
+        self.__learned_on = today
+        self.__likelihood = self.__learn_likelihood(
+            datetime.combine(today, time(), timezone.utc) - LOCAL_OFFSET
+        )
+
+    def __learn_likelihood(self, today: datetime) -> List[float]:
+        # Share of observed days on which the sheet changed during each
+        # local hour, smoothed towards the prior.
+        self.__checks.remove_checks_before(today - self.__history)
+        observed_days = [set() for _ in range(24)]
+        changed_days = [set() for _ in range(24)]
+        for checked_at, changed in self.__checks.get_checks_since(
+            today - self.__history
+        ):
+            if checked_at >= today:
+                break
+            local = checked_at + LOCAL_OFFSET
+            observed_days[local.hour].add(local.date())
+            if changed:
+                changed_days[local.hour].add(local.date())
+        w = self.__prior_weight
+        return [
+            (len(changed_days[hour]) + prior_change_likelihood(hour) * w)
+            / (len(observed_days[hour]) + w)
+            for hour in range(24)
+        ]
+
+    def __ceiling(self, hour: int) -> timedelta:
+        # The likelier a change during this hour, the shorter the longest
+        # interval the back-off grows to, from the longest interval down
+        # to the busy one. It falls geometrically, so even rare changes
+        # shorten it noticeably.
+        likelihood = min(self.__likelihood[hour], CHANGE_THRESHOLD)
+        ratio = self.__busy_interval / self.__max_interval
+        return self.__max_interval * ratio ** (likelihood / CHANGE_THRESHOLD)
+
+    def __failure_backoff(self) -> timedelta:
+        # Nothing to learn from failures, so busy hours are not checked
+        # more often either
+        backoff = self.__min_interval * (2 ** min(self.__failures, 16))
+        return min(backoff, self.__max_interval)
+
+    def interval(self, now: datetime) -> timedelta:
+        if self.__failures:
+            return self.__failure_backoff()
+        hour = (now + LOCAL_OFFSET).hour
+        # Exponential back-off while the sheet stays the same, starting
+        # over from the shortest interval after a change
+        backoff = self.__min_interval * (2 ** min(self.__unchanged_checks, 16))
+        return min(backoff, self.__ceiling(hour))
+
+    def next_check_at(self, now: datetime | None = None) -> datetime:
+        now = now or datetime.now(timezone.utc)
+        with self.__lock:
+            self.__relearn(now)
+            due = self.__last_check + self.interval(self.__last_check)
+            if self.__failures:
+                return due
+            # Do not sleep through the beginning of a busier hour
+            local = self.__last_check + LOCAL_OFFSET
+            next_hour = (
+                local.replace(minute=0, second=0, microsecond=0)
+                + timedelta(hours=1)
+                - LOCAL_OFFSET
+            )
+            if due > next_hour:
+                due = min(
+                    due, next_hour + self.__ceiling((local.hour + 1) % 24)
+                )
+            return due
+
+    def is_due(self, now: datetime | None = None) -> bool:
+        now = now or datetime.now(timezone.utc)
+        return now >= self.next_check_at(now)
+
+    def seconds_until_due(self, now: datetime | None = None) -> float:
+        now = now or datetime.now(timezone.utc)
+        return max(0.0, (self.next_check_at(now) - now).total_seconds())
+
+    def record_check(self, changed: bool, now: datetime | None = None):
+        now = now or datetime.now(timezone.utc)
+        with self.__lock:
+            self.__checks.add_check(now, changed)
+            self.__relearn(now)
+            self.__last_check = now
+            self.__failures = 0
+            if changed:
+                # Someone is editing the sheet, look again soon
+                self.__unchanged_checks = 0
+            else:
+                self.__unchanged_checks += 1
+
+    def record_failure(self, now: datetime | None = None):
+        # Nothing was compared, so the history the likelihood is learned
+        # from is left alone
+        now = now or datetime.now(timezone.utc)
+        with self.__lock:
+            self.__last_check = now
+            self.__failures += 1
+
+    def reset_backoff(self):
+        # The timetable was found changed elsewhere, e.g. by /update in a
+        # worker process with its own scheduler
+        with self.__lock:
+            self.__unchanged_checks = 0
+            self.__failures = 0
@@ -0,0 +1,27 @@
+from domain.snapshot_file import write_snapshot_file
+from domain.timetable_parser import get_all_timetables_from_file
+from domain.timetable_snapshot import get_file_version
+from typing import Hashable
+from threading import Lock
+
+
+class SnapshotPublisher:
+    # Parses the downloaded workbook once and writes a snapshot file that
+    # worker processes map instead of parsing the workbook themselves.
+    def __init__(self, timetable_file: str, snapshot_file: str):
+        self.__timetable_file = timetable_file
+        self.__snapshot_file = snapshot_file
+        self.__lock = Lock()
+        self.__published_version: Hashable = None
+
+    def publish(self) -> bool:
+        with self.__lock:
+            version = get_file_version(self.__timetable_file)
+            if version is None or version == self.__published_version:
+                return False
+            write_snapshot_file(
+                get_all_timetables_from_file(self.__timetable_file),
+                self.__snapshot_file,
+            )
+            self.__published_version = version
+            return True
@@ -1,27 +1,101 @@
-from typing import Iterator, Callable
-from services.types import Message
+from typing import Iterator, Callable, Hashable, List, Tuple
+from itertools import chain, islice
+from services.types import Message, pack_messages
+from services.lru_cache import LruCache
+from domain.lesson_index import LessonHit, is_search_word, stem, words
+from domain.limits import (
+    SEARCH_MAX_HITS,
+    TELEGRAM_MESSAGE_LEN,
+    TIMETABLE_RANGE_MAX_DAYS,
+)
+from domain.room_occupancy import RoomOccupancy
 from repositories.users_repository import UsersRepository
 from domain.user import User, ConversationState
-from domain.timetable_parser import get_timetable_for_group_from_file
+from domain.timetable_parser import Timetable
+from domain.timetable_snapshot import (
+    TimetableSnapshot,
+    get_file_version,
+    load_workbook_snapshot,
+)
+from threading import Lock
 import re
 from datetime import datetime, timedelta, timezone, date
 
+DAYS = [
+    "понедельник",
+    "вторник",
+    "сред[ау]",
+    "четверг",
+    "пятниц[ау]",
+    "суббот[ау]",
+    "воскресенье",
+]
+# E.g. "свободные аудитории вторник 3 пара"
+FREE_ROOMS = r"^\s*свободн\w*\s+(?:аудитори|кабинет)\w*(.*)$"
+# E.g. "где Иванов", "когда матанализ"
+SEARCH = r"^\s*(?:где|когда|найти|поиск)\s+(.+)$"
+
 
 class GroupNotFoundException(Exception):
     def __init__(self):
         super(GroupNotFoundException, self).__init__("Could not find group.")
 
 
+def get_week_number(day: date, week_count_start: date) -> int:
+    # Counted by dates, so that it is right across a new year
+    first_monday = week_count_start - timedelta(
+        days=week_count_start.weekday()
+    )
+    return (day - first_monday).days // 7 + 1
+
+
 class TimetableService:
     def __init__(
         self,
         timetable_file: str,
         users_repository: UsersRepository,
         week_count_start_generator: Callable[[], date],
+        load_snapshot: Callable[
+            [str, Hashable], TimetableSnapshot
+        ] = load_workbook_snapshot,
     ):
         self.__timetable_file = timetable_file
         self.__users = users_repository
         self.__week_count_start_generator = week_count_start_generator
+        self.__load_snapshot = load_snapshot
+        self.__snapshot_lock = Lock()
+        self.__snapshot = TimetableSnapshot([])
+        self.__snapshot_version: Hashable = None
+        self.__renders: LruCache[Message] = LruCache(4096)
+        self.__searches: LruCache[List[LessonHit]] = LruCache(256)
+
+    def __get_snapshot(self) -> TimetableSnapshot:
+        version = get_file_version(self.__timetable_file)
+        with self.__snapshot_lock:
+            if version != self.__snapshot_version:
+                # Loaded once per downloaded timetable, not per request
+                self.__snapshot = (
+                    self.__load_snapshot(self.__timetable_file, version)
+                    if version
+                    else TimetableSnapshot([], version)
+                )
+                self.__snapshot_version = version
+            return self.__snapshot
+
+    def is_ready(self) -> bool:
+        return get_file_version(self.__timetable_file) is not None
+
+    def warm_up(self) -> None:
+        self.__get_snapshot()
+
+    def get_timetable(self, group: str) -> Tuple[Hashable, Timetable]:
+        # Also returns the version of the loaded timetable, for caches of
+        # anything made from it
+        snapshot = self.__get_snapshot()
+        tt = snapshot.get(group) if group else None
+        if tt is None:
+            raise GroupNotFoundException()
+        return snapshot.version, tt
 
     def prompt_group(self, user: User) -> Iterator[Message]:
         user.conversation_state = ConversationState.SETTING_GROUP
@@ -38,50 +112,200 @@ class TimetableService:
     ) -> Iterator[Message]:
         if not group:
             raise GroupNotFoundException()
-        tt = get_timetable_for_group_from_file(self.__timetable_file, group)
+        snapshot = self.__get_snapshot()
+        tt = snapshot.get(group)
         if tt is None:
             raise GroupNotFoundException()
+        week_count_start = self.__week_count_start_generator()
         for i in range(length):
-            day = tt.timetable[(start + i) % len(tt.timetable)]
-            week_count_start = self.__week_count_start_generator()
-            week_number_str = ""
-            current_date = None
-            week_number = None
-            if start_date and week_count_start:
-                current_date = start_date + timedelta(days=i)
-                week_number = (
-                    current_date.isocalendar()[1]
-                    - week_count_start.isocalendar()[1]
-                ) + 1
-                week_number_str = (
-                    f"{current_date.isoformat()}, неделя {week_number}, "
+            day_index = (start + i) % len(tt.timetable)
+            current_date = (
+                start_date + timedelta(days=i) if start_date else None
+            )
+            # Inline pages and day navigation show the same days over and
+            # over, so renders are cached for the current timetable
+            yield self.__renders.get_or_compute(
+                (
+                    snapshot.version,
+                    group,
+                    day_index,
+                    current_date,
+                    week_count_start,
+                    highlight_phrases,
+                ),
+                lambda: self.__render_day(
+                    tt,
+                    group,
+                    day_index,
+                    current_date,
+                    week_count_start,
+                    highlight_phrases,
+                ),
+            )
+
+    def __render_day(
+        self,
+        tt: Timetable,
+        group: str,
+        day_index: int,
+        current_date: date | None,
+        week_count_start: date | None,
+        highlight_phrases: str,
+    ) -> Message:
+        day = tt.timetable[day_index]
+        week_number_str = ""
+        week_number = None
+        if current_date:
+            week_number_str = f"{current_date.isoformat()}, "
+        if current_date and week_count_start:
+            week_number = get_week_number(current_date, week_count_start)
+            if week_number < 1:
+                week_number = None  # Before the semester, nothing to count
+            else:
+                week_number_str += f"неделя {week_number}, "
+        reply = (
+            f"<b><u>{day.weekday}</u></b> "
+            f"({week_number_str}группа {group}):\n"
+        )
+        for row in day.timetable:
+            lesson = row.lessons or "—"
+            highlights = [group] + highlight_phrases.splitlines()
+            for highlight in highlights:
+                lesson = re.sub(
+                    re.escape(highlight),
+                    r"<i><u>\g<0></u></i>",
+                    lesson,
+                    flags=re.IGNORECASE,
                 )
-            reply = (
-                f"<b><u>{day.weekday}</u></b> "
-                f"({week_number_str}группа {group}):\n"
+            reply += f"\n<b><i>{row.time}</i></b>\n{lesson}\n"
+        if len(day.timetable) == 0:
+            reply += '<span class="tg-spoiler">отдыхать</span>'
+        return Message(
+            reply,
+            meta={
+                "day": current_date.isoformat() if current_date else "",
+                "weekday": day.weekday,
+                "group": group,
+                "week_number": str(week_number),
+                "lessons": str(sum(1 for row in day.timetable if row.lessons)),
+            },
+        )
+
+    def __render_hit(self, hit: LessonHit, query: str) -> Message:
+        lesson = hit.lessons
+        for word in words(query):
+            if is_search_word(word):
+                # The same words the index matched
+                pattern = (
+                    rf"\b{word}\b"
+                    if word.isdigit()
+                    else rf"\b{re.escape(stem(word))}\w*"
+                )
+                lesson = re.sub(
+                    pattern,
+                    r"<i><u>\g<0></u></i>",
+                    lesson,
+                    flags=re.IGNORECASE,
+                )
+        groups = ", ".join(hit.groups)
+        return Message(
+            f"<b><u>{hit.weekday}</u></b>, <b><i>{hit.time}</i></b> "
+            f"({'группы' if len(hit.groups) > 1 else 'группа'} {groups}):\n"
+            f"{lesson}",
+            meta={
+                "weekday": f"{hit.weekday}, {hit.time}",
+                "group": groups,
+            },
+        )
+
+    def search_lessons(
+        self, query: str, pack: bool = False
+    ) -> Iterator[Message]:
+        snapshot = self.__get_snapshot()
+        # Inline results are paged by repeating the query, so hits and
+        # their rendering are kept per query
+        key = (snapshot.version, " ".join(words(query)))
+        hits = self.__searches.get_or_compute(
+            key, lambda: snapshot.lesson_index.search(query)
+        )
+        if not hits:
+            return iter([Message("Ничего не найдено.", is_error=True)])
+        found = (
+            self.__renders.get_or_compute(
+                ("hit", *key, i), lambda: self.__render_hit(hit, query)
             )
-            for row in day.timetable:
-                lesson = row.lessons or "—"
-                highlights = [group] + highlight_phrases.splitlines()
-                for highlight in highlights:
-                    lesson = re.sub(
-                        re.escape(highlight),
-                        r"<i><u>\g<0></u></i>",
-                        lesson,
-                        flags=re.IGNORECASE,
+            for i, hit in enumerate(hits)
+        )
+        if not pack:
+            return found
+        found = pack_messages(islice(found, SEARCH_MAX_HITS))
+        if len(hits) > SEARCH_MAX_HITS:
+            return chain(
+                found,
+                [
+                    Message(
+                        f"Показаны первые {SEARCH_MAX_HITS} совпадений "
+                        f"из {len(hits)}. Уточните запрос."
                     )
-                reply += f"\n<b><i>{row.time}</i></b>\n{lesson}\n"
-            if len(day.timetable) == 0:
-                reply += '<span class="tg-spoiler">отдыхать</span>'
-            yield Message(
-                reply,
-                meta={
-                    "day": current_date.isoformat() if current_date else "",
-                    "weekday": day.weekday,
-                    "group": group,
-                    "week_number": str(week_number),
-                },
+                ],
             )
+        return found
+
+    def free_rooms(self, text: str, pack: bool = False) -> Iterator[Message]:
+        # Today unless a weekday or a word like "завтра" is given, every
+        # slot of the day unless e.g. "3 пара" is given
+        day_index = (datetime.now(timezone.utc) + timedelta(hours=3)).weekday()
+        for i, day in enumerate(DAYS):
+            if re.search(rf"\b{day}\b", text, re.IGNORECASE):
+                day_index = i
+                break
+        else:
+            for word, shift in (("послезавтра", 2), ("завтра", 1)):
+                if re.search(rf"\b{word}\b", text, re.IGNORECASE):
+                    day_index = (day_index + shift) % 7
+                    break
+        occupancy = self.__get_snapshot().room_occupancy
+        if not occupancy.rooms:
+            return iter(
+                [Message("В расписании не указаны аудитории.", is_error=True)]
+            )
+        weekday = occupancy.weekday(day_index)
+        if weekday is None or occupancy.slots(day_index) == 0:
+            return iter([Message("В этот день занятий нет.", is_error=True)])
+        slot = re.search(r"(\d)\s*-?\s*(?:я\s*)?пар", text)
+        if slot:
+            slots = [int(slot.group(1)) - 1]
+            if not 0 <= slots[0] < occupancy.slots(day_index):
+                return iter(
+                    [Message("Такой пары нет в расписании.", is_error=True)]
+                )
+        else:
+            slots = range(occupancy.slots(day_index))
+        found = (
+            self.__render_free_rooms(occupancy, day_index, weekday, s)
+            for s in slots
+        )
+        return pack_messages(found) if pack else found
+
+    def __render_free_rooms(
+        self, occupancy: RoomOccupancy, day_index: int, weekday: str, slot: int
+    ) -> Message:
+        header = (
+            f"<b><u>{weekday}</u></b>, {slot + 1} пара "
+            f"(<b><i>{occupancy.slot_time(day_index, slot)}</i></b>), "
+            "свободные аудитории:\n"
+        )
+        rooms = occupancy.free_rooms(day_index, slot)
+        text = header + (", ".join(rooms) or "нет")
+        if len(text) > TELEGRAM_MESSAGE_LEN:
+            # Cut at a room, leaving space for the note
+            text = text[: TELEGRAM_MESSAGE_LEN - 32].rsplit(", ", 1)[0]
+            shown = text[len(header) :].count(", ") + 1
+            text += f" и еще {len(rooms) - shown}"
+        return Message(
+            text,
+            meta={"weekday": f"{weekday}, {slot + 1} пара"},
+        )
 
     def timetable_range(
         self,
@@ -97,18 +321,55 @@ class TimetableService:
             group, now.weekday(), length, highlight_phrases, now.date()
         )
 
+    def timetable_dates(
+        self,
+        group: str,
+        first: date,
+        last: date,
+        highlight_phrases: str = "",
+        pack: bool = False,
+    ) -> Iterator[Message]:
+        if last < first:
+            return iter(
+                [
+                    Message(
+                        "Конец периода не может быть раньше его начала.",
+                        is_error=True,
+                    )
+                ]
+            )
+        length = (last - first).days + 1
+        # Days are rendered one by one as they are sent, so even a long
+        # range does not build up in memory
+        days = self.timetable_range_starting_from(
+            group,
+            first.weekday(),
+            min(length, TIMETABLE_RANGE_MAX_DAYS),
+            highlight_phrases,
+            first,
+        )
+        if not pack:
+            return days
+        days = pack_messages(days)
+        if length > TIMETABLE_RANGE_MAX_DAYS:
+            return chain(
+                days,
+                [
+                    Message(
+                        "Показаны только первые "
+                        f"{TIMETABLE_RANGE_MAX_DAYS} дня периода."
+                    )
+                ],
+            )
+        return days
+
     def guess_request(
-        self, group: str, text: str, highlight_phrases: str = ""
+        self,
+        group: str,
+        text: str,
+        highlight_phrases: str = "",
+        pack_ranges: bool = True,
     ) -> Iterator[Message]:
-        DAYS = [
-            "понедельник",
-            "вторник",
-            "сред[ау]",
-            "четверг",
-            "пятниц[ау]",
-            "суббот[ау]",
-            "воскресенье",
-        ]
         REQUESTS_WORDS = {
             "сегодня": (0, 1),
             "завтра": (1, 1),
@@ -117,6 +378,44 @@ class TimetableService:
             "позавчера": (-2, 1),
             "недел[яю]": (0, 7),
         }
+        free_rooms = re.match(FREE_ROOMS, text, re.IGNORECASE)
+        if free_rooms:
+            return self.free_rooms(free_rooms.group(1), pack_ranges)
+        search = re.match(SEARCH, text, re.IGNORECASE)
+        if search:
+            return self.search_lessons(search.group(1), pack_ranges)
+        DATE = r"(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?"
+        today = (datetime.now(timezone.utc) + timedelta(hours=3)).date()
+        dates = re.match(rf"^{DATE}\s*(?:-|–|—|\.\.)\s*{DATE}$", text)
+        if dates:
+            d1, m1, y1, d2, m2, y2 = dates.groups()
+            try:
+                first = date(int(y1 or today.year), int(m1), int(d1))
+                last = date(int(y2 or first.year), int(m2), int(d2))
+                if (
+                    last < first
+                    and not y2
+                    and first.month >= 11
+                    and last.month <= 2
+                ):
+                    # Only across a new year, e.g. 25.12-10.01
+                    last = last.replace(year=last.year + 1)
+            except ValueError:
+                return iter(
+                    [Message("Такой даты не существует.", is_error=True)]
+                )
+            return self.timetable_dates(
+                group, first, last, highlight_phrases, pack_ranges
+            )
+        shifts = re.match(r"^([+-]?\d{1,3})\s*\.\.\s*([+-]?\d{1,3})$", text)
+        if shifts:
+            return self.timetable_dates(
+                group,
+                today + timedelta(days=int(shifts.group(1))),
+                today + timedelta(days=int(shifts.group(2))),
+                highlight_phrases,
+                pack_ranges,
+            )
         if re.match(r"^[+-]?\d{1,2}$", text):
             try:
                 if text.startswith("+") or text.startswith("-"):
@@ -174,7 +473,14 @@ class TimetableService:
                     "  Примеры: на сегодня; на вчера; послезавтра; на неделю\n"
                     "- Дата в году (месяце), в формате "
                     "<code>день.[месяц[.год]]</code>.\n"
-                    "  Примеры: 3.; 03.12; 1.1",
+                    "  Примеры: 3.; 03.12; 1.1\n"
+                    "- Период между двумя датами или сдвигами.\n"
+                    "  Примеры: 1.10-15.10; +0..+13\n"
+                    "- Поиск по занятиям всех групп.\n"
+                    "  Примеры: где Иванов; когда матанализ; найти ауд. 101\n"
+                    "- Свободные аудитории в день или на паре.\n"
+                    "  Примеры: свободные аудитории; "
+                    "свободные аудитории вторник 3 пара",
                     is_error=True,
                 )
             ]
@@ -186,14 +492,23 @@ class TimetableService:
         user_group: str | None = None,
         user_highlight_phrases: str | None = None,
     ) -> Iterator[Message]:
-        res = re.search(r"\b(\d{1,2}-\d{2,3}\w{,2})\b(.*)", text)
+        free_rooms = re.match(FREE_ROOMS, text, re.IGNORECASE)
+        if free_rooms:
+            return self.free_rooms(free_rooms.group(1))
+        search = re.match(SEARCH, text, re.IGNORECASE)
+        if search:
+            return self.search_lessons(search.group(1))
+        # Not a part of a date range like 1.10-15.10
+        res = re.search(
+            r"(?<![.\d])\b(\d{1,2}-\d{2,3}\w{,2})\b(?!\.)(.*)", text
+        )
         if res and len(res.groups()) >= 2:
             groups = res.groups()
             group = groups[0]
             rest = groups[1].strip()
             if group and rest:
                 return self.guess_request(
-                    group, rest, user_highlight_phrases or ""
+                    group, rest, user_highlight_phrases or "", False
                 )
             elif group:
                 return self.timetable_range(
@@ -201,13 +516,16 @@ class TimetableService:
                 )
         elif user_group is not None:
             return self.guess_request(
-                user_group, text, user_highlight_phrases or ""
+                user_group, text, user_highlight_phrases or "", False
             )
         raise GroupNotFoundException()
 
+    def resolve_group(self, group: str) -> str | None:
+        location = self.__get_snapshot().index.get(group)
+        return location.name if location else None
+
+    def suggest_groups(self, group: str, limit: int = 3) -> List[str]:
+        return self.__get_snapshot().index.suggest(group, limit)
+
     def try_group(self, group: str) -> bool:
-        try:
-            self.timetable_range_starting_from(group, 0, 0)
-            return True
-        except GroupNotFoundException:
-            return False
+        return self.resolve_group(group) is not None
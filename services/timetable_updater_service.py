@@ -1,36 +1,33 @@
 from repositories.settings_repository import SettingsRepository
+from services.refresh_scheduler import RefreshScheduler
 from threading import Lock
-from datetime import datetime, timezone, timedelta
-from domain.timetable_loader import download_timetable_from_url
+from domain.timetable_loader import (
+    download_timetable_from_url,
+    get_timetable_hash,
+    save_timetable,
+)
 from services.types import Message, Recipient
 from typing import Iterator
+import os
 
 
 class TimetableUpdaterService:
     def __init__(
-        self, timetable_file: str, settings_repository: SettingsRepository
+        self,
+        timetable_file: str,
+        settings_repository: SettingsRepository,
+        scheduler: RefreshScheduler,
     ):
         self.__timetable_file = timetable_file
         self.__settings = settings_repository
+        self.__scheduler = scheduler
         self.__lock = Lock()
-        self.__last_update = datetime.fromtimestamp(0, timezone.utc)
 
     def really_update_timetable(self) -> bool:
-        now = datetime.now(timezone.utc)
-        passed = now - self.__last_update
-        now += timedelta(hours=3)
-        if now.hour in range(0, 7):
-            # Night time, no need to update so frequently
-            # Update will happen every ~3 hours
-            return passed.seconds >= 3 * 60 * 60
-        elif now.hour in range(7, 18):
-            # Work time, modifications are likely to be made in this time range
-            # Update will happen every ~5 minutes
-            return passed.seconds >= 5 * 60
-        else:  # 18 - 24
-            # Evening, modifications can happen but not as likely
-            # Update will happen every ~30 minutes
-            return passed.seconds >= 30 * 60
+        return self.__scheduler.is_due()
+
+    def seconds_until_next_update(self) -> float:
+        return self.__scheduler.seconds_until_due()
 
     def update_timetable(self, force=False) -> Iterator[Message]:
         if not (force or self.really_update_timetable()):
@@ -39,14 +36,26 @@ class TimetableUpdaterService:
         if link:
             try:
                 with self.__lock:
-                    download_timetable_from_url(link, self.__timetable_file)
-                    self.__last_update = datetime.now(timezone.utc)
+                    content = download_timetable_from_url(link)
+                    content_hash = get_timetable_hash(content)
+                    changed = (
+                        content_hash != self.__settings.get_timetable_hash()
+                    )
+                    # Unchanged timetable is not rewritten, so it is not
+                    # parsed again either
+                    if changed or not os.path.exists(self.__timetable_file):
+                        save_timetable(content, self.__timetable_file)
+                        self.__settings.set_timetable_hash(content_hash)
+                    self.__scheduler.record_check(changed)
             except Exception as e:
+                # Back off on failures too, instead of retrying every tick
+                self.__scheduler.record_failure()
                 yield Message(
                     "Не удалось обновить расписание. Причина: " + str(e),
                     Recipient.ADMIN,
                 )
         else:
+            self.__scheduler.record_failure()
             yield Message(
                 "Укажите, пожалуйста, ссылку на расписание. "
                 "Для этого напишите /settt.",
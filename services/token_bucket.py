@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Hashable, List
+
+
+class TokenBucketLimiter:
+    # One bucket of `capacity` tokens per key, refilled over `period`
+    # seconds. Only `max_keys` recently seen keys are kept: a forgotten
+    # key starts again with a full bucket, which is what an idle key would
+    # have had anyway.
+    def __init__(self, capacity: float, period: float, max_keys: int = 10000):
+        self.__capacity = capacity
+        self.__refill_rate = capacity / period
+        self.__max_keys = max_keys
+        self.__lock = Lock()
+        # key -> [tokens, updated at, requests rejected in a row]
+        self.__buckets: OrderedDict[Hashable, List[float]] = OrderedDict()
+        self.__rejected = 0
+
+    @property
+    def rejected(self) -> int:
+        return self.__rejected
+
+    def limited_keys(self) -> int:
+        # Keys that would be rejected right now, their buckets refilled
+        # since the last request
+        now = monotonic()
+        with self.__lock:
+            return sum(
+                1
+                for tokens, updated_at, _ in self.__buckets.values()
+                if tokens + (now - updated_at) * self.__refill_rate < 1
+            )
+
+    def acquire(self, key: Hashable) -> int:
+        # Returns 0 if the request is allowed, otherwise how many requests
+        # in a row were rejected, so that only the first one is answered
+        now = monotonic()
+        with self.__lock:
+            bucket = self.__buckets.get(key)
+            if bucket is None:
+                bucket = [self.__capacity, now, 0]
+                self.__buckets[key] = bucket
+                if len(self.__buckets) > self.__max_keys:
+                    self.__buckets.popitem(last=False)
+            else:
+                self.__buckets.move_to_end(key)
+                bucket[0] = min(
+                    self.__capacity,
+                    bucket[0] + (now - bucket[1]) * self.__refill_rate,
+                )
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                bucket[2] = 0
+                return 0
+            bucket[2] += 1
+            self.__rejected += 1
+            return int(bucket[2])
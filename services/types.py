@@ -1,5 +1,6 @@
 from enum import Enum
-from typing import Dict
+from typing import Dict, Iterable, Iterator
+from domain.limits import TELEGRAM_MESSAGE_LEN
 
 
 class Recipient(Enum):
@@ -34,3 +35,49 @@ class Message:
 
     def get_meta(self, key: str):
         return self.__meta.get(key)
+
+
+def split_text(text: str, limit: int = TELEGRAM_MESSAGE_LEN) -> Iterator[str]:
+    # Splits at line boundaries, only a line longer than the limit is cut
+    chunk = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if chunk:
+                yield chunk
+                chunk = ""
+            yield line[:limit]
+            line = line[limit:]
+        if chunk and len(chunk) + 1 + len(line) > limit:
+            yield chunk
+            chunk = line
+        else:
+            chunk = f"{chunk}\n{line}" if chunk else line
+    if chunk:
+        yield chunk
+
+
+def pack_messages(
+    messages: Iterable[Message], limit: int = TELEGRAM_MESSAGE_LEN
+) -> Iterator[Message]:
+    # Joins consecutive replies into as few messages as Telegram allows,
+    # holding at most one message worth of text at a time. Replies that
+    # are too long on their own are split.
+    text = ""
+    for message in messages:
+        if message.is_error or message.to != Recipient.SENDER:
+            if text:
+                yield Message(text)
+                text = ""
+            if len(message.text) <= limit:
+                yield message
+                continue
+            for chunk in split_text(message.text, limit):
+                yield Message(chunk, message.to, message.is_error)
+            continue
+        for chunk in split_text(message.text, limit):
+            if text and len(text) + 2 + len(chunk) > limit:
+                yield Message(text)
+                text = ""
+            text = f"{text}\n\n{chunk}" if text else chunk
+    if text:
+        yield Message(text)
@@ -0,0 +1,25 @@
+from benchmarks.timetable_memory import make_workbook
+from datetime import date
+from repositories.users_repository import UsersRepository
+from services.timetable_service import TimetableService
+import pytest
+import sqlite3
+
+WEEK_COUNT_START = date(2030, 9, 2)
+
+
+@pytest.fixture(scope="session")
+def timetable_file(tmp_path_factory) -> str:
+    # Groups 01-100 to 01-104
+    filename = str(tmp_path_factory.mktemp("timetable") / "timetable.xlsx")
+    make_workbook(filename, 1, 5)
+    return filename
+
+
+@pytest.fixture
+def service(timetable_file) -> TimetableService:
+    return TimetableService(
+        timetable_file,
+        UsersRepository(sqlite3.connect(":memory:")),
+        lambda: WEEK_COUNT_START,
+    )
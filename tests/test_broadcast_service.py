@@ -0,0 +1,49 @@
+from repositories.broadcasts_repository import BroadcastsRepository
+from repositories.users_repository import UsersRepository
+from services.broadcast_service import BroadcastService
+from services.rate_limiter import RateLimiter
+import sqlite3
+
+
+def broadcast_service(user_count: int, send=lambda chat_id, text: None):
+    db = sqlite3.connect(":memory:", check_same_thread=False)
+    users = UsersRepository(db)
+    for user_id in range(1, user_count + 1):
+        users.get_or_add_user_by_id(user_id)
+    return BroadcastService(
+        users,
+        BroadcastsRepository(db),
+        send,
+        RateLimiter(1e6),
+        checkpoint_every=2,
+        progress_interval=1e6,
+    )
+
+
+def test_unfinished_broadcast_blocks_new_ones_until_cancelled():
+    broadcaster = broadcast_service(3)
+    first = broadcaster.start_broadcast("Первая")
+    assert broadcaster.start_broadcast("Вторая") is None
+    assert broadcaster.cancel_broadcast().id == first.id
+    assert broadcaster.unfinished_broadcast() is None
+    assert broadcaster.start_broadcast("Вторая") is not None
+
+
+def test_cancel_without_broadcast():
+    assert broadcast_service(3).cancel_broadcast() is None
+
+
+def test_running_broadcast_stops_after_cancel():
+    sent = []
+
+    def send(chat_id: int, text: str):
+        sent.append(chat_id)
+        if len(sent) == 3:
+            broadcaster.cancel_broadcast()
+
+    broadcaster = broadcast_service(10, send)
+    broadcast = broadcaster.start_broadcast("Всем")
+    replies = [m.text for m in broadcaster.run_broadcast(broadcast)]
+    assert sent == [1, 2, 3, 4]
+    assert "отменена" in replies[-1]
+    assert broadcaster.unfinished_broadcast() is None
@@ -0,0 +1,69 @@
+from domain.snapshot_file import MappedTimetableSnapshot, write_snapshot_file
+from domain.timetable_snapshot import load_workbook_snapshot
+from repositories.calendar_files_repository import CalendarFilesRepository
+from repositories.users_repository import UsersRepository
+from services.calendar_service import CalendarService
+from services.timetable_service import GroupNotFoundException, TimetableService
+from datetime import date
+import os
+import pytest
+import shutil
+import sqlite3
+
+
+@pytest.fixture
+def calendars(service, tmp_path) -> CalendarService:
+    return CalendarService(
+        service,
+        CalendarFilesRepository(sqlite3.connect(":memory:")),
+        lambda: date(2030, 9, 2),
+        str(tmp_path),
+    )
+
+
+def test_group_spellings_share_one_file(calendars, tmp_path):
+    calendar = calendars.get_calendar("01-100")
+    calendars.remember_file_id(calendar, "file")
+    for spelling in ("01 - 100", "01–100"):
+        same = calendars.get_calendar(spelling)
+        assert same.group == "01-100"
+        assert same.filename == calendar.filename
+        assert same.file_id == "file"
+    assert os.listdir(tmp_path) == [os.path.basename(calendar.filename)]
+
+
+def test_unknown_group(calendars):
+    with pytest.raises(GroupNotFoundException):
+        calendars.get_calendar("99-999")
+
+
+def test_key_survives_restarts_and_workers(timetable_file, tmp_path):
+    files = CalendarFilesRepository(sqlite3.connect(":memory:"))
+    cache_dir = str(tmp_path / "calendars")
+    filename = str(tmp_path / "timetable.xlsx")
+    snapshot_file = str(tmp_path / "timetable.snapshot")
+
+    def calendars(load_snapshot=load_workbook_snapshot):
+        service = TimetableService(
+            filename,
+            UsersRepository(sqlite3.connect(":memory:")),
+            lambda: date(2030, 9, 2),
+            load_snapshot,
+        )
+        return CalendarService(
+            service, files, lambda: date(2030, 9, 2), cache_dir
+        )
+
+    shutil.copy(timetable_file, filename)
+    calendar = calendars().get_calendar("01-100")
+    calendars().remember_file_id(calendar, "file")
+    # The same timetable downloaded again and published for workers
+    shutil.copy(timetable_file, filename)
+    write_snapshot_file(load_workbook_snapshot(filename), snapshot_file)
+    for restarted in (
+        calendars(),
+        calendars(lambda _, version: MappedTimetableSnapshot(snapshot_file)),
+    ):
+        same = restarted.get_calendar("01-100")
+        assert (same.key, same.file_id) == (calendar.key, "file")
+    assert os.listdir(cache_dir) == [os.path.basename(calendar.filename)]
@@ -0,0 +1,28 @@
+from datetime import date
+from services.timetable_service import TimetableService
+
+
+def request(service: TimetableService, text: str):
+    return list(service.guess_request("01-100", text, pack_ranges=False))
+
+
+def test_reversed_range_is_an_error(service):
+    replies = request(service, "15.10-1.10")
+    assert len(replies) == 1
+    assert replies[0].is_error
+    assert "Конец периода" in replies[0].text
+
+
+def test_range_across_new_year(service):
+    replies = request(service, "25.12-10.01")
+    assert len(replies) == 17
+    assert replies[0].get_meta("day").endswith("-12-25")
+    assert replies[-1].get_meta("day").endswith("-01-10")
+
+
+def test_no_week_number_before_semester(service):
+    before, first = request(service, "1.09.2030-2.09.2030")
+    assert "неделя" not in before.text
+    assert before.get_meta("week_number") == "None"
+    assert "неделя 1," in first.text
+    assert first.get_meta("day") == date(2030, 9, 2).isoformat()
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+from repositories.digests_repository import DigestsRepository
+from repositories.users_repository import UsersRepository
+from services.digest_service import MAX_CATCH_UP, DigestService
+from services.rate_limiter import RateLimiter
+import sqlite3
+
+MINUTE = timedelta(minutes=1)
+START = datetime(2030, 9, 2, 6, 0, 30, tzinfo=timezone.utc)
+
+
+def digest_service(db, service, prepared: list) -> DigestService:
+    digests = DigestService(
+        service,
+        UsersRepository(db),
+        DigestsRepository(db),
+        lambda chat_id, text: None,
+        RateLimiter(1e6),
+    )
+    # Only the prepared minutes matter here
+    digests.prepare = lambda at: prepared.append(at) or 0
+    return digests
+
+
+def test_restart_resumes_after_last_prepared_minute(service):
+    db = sqlite3.connect(":memory:")
+    prepared = []
+    digest_service(db, service, prepared).prepare_due(START)
+    # Restarted three minutes later
+    digest_service(db, service, prepared).prepare_due(START + 3 * MINUTE)
+    minute = START.replace(second=0)
+    assert prepared == [minute + i * MINUTE for i in range(1, 5)]
+
+
+def test_catch_up_is_capped(service):
+    db = sqlite3.connect(":memory:")
+    digest_service(db, service, []).prepare_due(START)
+    prepared = []
+    digest_service(db, service, prepared).prepare_due(
+        START + timedelta(hours=2)
+    )
+    assert len(prepared) == MAX_CATCH_UP // MINUTE
+    assert prepared[-1] == (START + timedelta(hours=2, minutes=1)).replace(
+        second=0
+    )
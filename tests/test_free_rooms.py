@@ -0,0 +1,38 @@
+from domain.group_index import GroupLocation
+from domain.timetable_parser import Timetable, TimetableRow, WeekdayTimetable
+from domain.timetable_snapshot import TimetableSnapshot
+from repositories.users_repository import UsersRepository
+from services.timetable_service import TimetableService
+import sqlite3
+
+
+def free_rooms_service(timetable_file) -> TimetableService:
+    # Lessons on Monday only, Tuesday is listed without any rows
+    timetable = Timetable()
+    timetable.add_weekday(WeekdayTimetable("Понедельник"))
+    timetable.add_row_to_last_weekday(
+        TimetableRow("8:30-10:00", "Дисциплина\nауд. 101")
+    )
+    timetable.add_weekday(WeekdayTimetable("Вторник"))
+    return TimetableService(
+        timetable_file,
+        UsersRepository(sqlite3.connect(":memory:")),
+        lambda: None,
+        lambda filename, version: TimetableSnapshot(
+            [(GroupLocation("01-100", 0, 3), timetable)], version
+        ),
+    )
+
+
+def test_day_without_slots_has_no_lessons(timetable_file):
+    replies = list(free_rooms_service(timetable_file).free_rooms("вторник"))
+    assert [(m.text, m.is_error) for m in replies] == [
+        ("В этот день занятий нет.", True)
+    ]
+
+
+def test_day_with_slots_lists_rooms(timetable_file):
+    replies = list(
+        free_rooms_service(timetable_file).free_rooms("понедельник")
+    )
+    assert len(replies) == 1 and not replies[0].is_error
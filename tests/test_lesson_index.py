@@ -0,0 +1,48 @@
+from domain.group_index import GroupLocation
+from domain.lesson_index import build_lesson_index
+from domain.timetable_parser import Timetable, TimetableRow, WeekdayTimetable
+from domain.timetable_snapshot import TimetableSnapshot
+from repositories.users_repository import UsersRepository
+from services.timetable_service import TimetableService
+import sqlite3
+
+LESSONS = [
+    "Физика\nИванов И.И.\nауд. 5",
+    "Физика\nИванов И.И.\nауд. 15",
+    "Химия 7 (лаб.)\nПетров П.П.\nауд. 55",
+]
+
+
+def timetables():
+    timetable = Timetable()
+    timetable.add_weekday(WeekdayTimetable("Понедельник"))
+    for lessons in LESSONS:
+        timetable.add_row_to_last_weekday(TimetableRow("8:30", lessons))
+    return [(GroupLocation("01-100", 0, 3), timetable)]
+
+
+def found(query):
+    return [
+        hit.lessons for hit in build_lesson_index(timetables()).search(query)
+    ]
+
+
+def test_single_digits_are_searched_exactly():
+    assert found("ауд. 5") == [LESSONS[0]]
+    assert found("химия 7") == [LESSONS[2]]
+    assert found("химия 5") == []
+
+
+def test_single_letters_are_ignored():
+    assert found("Иванов И") == LESSONS[:2]
+
+
+def test_single_digits_are_highlighted(timetable_file):
+    service = TimetableService(
+        timetable_file,
+        UsersRepository(sqlite3.connect(":memory:")),
+        lambda: None,
+        lambda filename, version: TimetableSnapshot(timetables(), version),
+    )
+    (message,) = service.search_lessons("ауд 5")
+    assert "<i><u>5</u></i>" in message.text
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta, timezone
+from repositories.timetable_checks_repository import TimetableChecksRepository
+from services.refresh_scheduler import LOCAL_OFFSET, RefreshScheduler
+import sqlite3
+
+MINUTE = timedelta(minutes=1)
+# Local midnight of the simulated day
+DAY = datetime(2030, 3, 4, tzinfo=timezone.utc) - LOCAL_OFFSET
+
+
+def checks_repository(change_hours=(), change_every=3):
+    # Four weeks of checks every 10 minutes from 7 to 23 local time, the
+    # sheet changed during change_hours on every change_every-th day
+    checks = TimetableChecksRepository(sqlite3.connect(":memory:"))
+    for day in range(1, 29):
+        start = DAY - timedelta(days=day)
+        for minute in range(7 * 60, 23 * 60, 10):
+            at = start + minute * MINUTE
+            changed = day % change_every == 0 and minute // 60 in change_hours
+            checks.add_check(at, changed)
+    return checks
+
+
+def simulate_day(scheduler: RefreshScheduler):
+    # (local hour, interval) of every check of an unchanged day
+    intervals = []
+    # Backed off through the evening before, like a running bot. Checks
+    # of the simulated day itself are not learned from.
+    for i in range(16):
+        scheduler.record_check(False, DAY)
+    now = DAY
+    while now < DAY + timedelta(days=1):
+        scheduler.record_check(False, now)
+        due = scheduler.next_check_at(now)
+        intervals.append(((now + LOCAL_OFFSET).hour, due - now))
+        now = due
+    return intervals
+
+
+def old_schedule_checks():
+    # Checks of a day with the former fixed intervals, which were compared
+    # with the time since the last check every minute
+    count = 0
+    last = DAY - timedelta(hours=3)
+    for minute in range(24 * 60):
+        now = DAY + minute * MINUTE
+        hour = (now + LOCAL_OFFSET).hour
+        if hour in range(0, 7):
+            interval = timedelta(hours=3)
+        elif hour in range(7, 18):
+            interval = 5 * MINUTE
+        else:
+            interval = 30 * MINUTE
+        if now - last >= interval:
+            last = now
+            count += 1
+    return count
+
+
+def longest(intervals, hours):
+    return max(interval for hour, interval in intervals if hour in hours)
+
+
+def test_day_without_history_checks_no_more_than_before():
+    checks = TimetableChecksRepository(sqlite3.connect(":memory:"))
+    intervals = simulate_day(RefreshScheduler(checks))
+    assert len(intervals) <= old_schedule_checks()
+    assert longest(intervals, range(0, 6)) >= timedelta(hours=1)
+    assert longest(intervals, range(7, 18)) == 5 * MINUTE
+    assert longest(intervals, range(18, 23)) == 30 * MINUTE
+
+
+def test_quiet_history_checks_less():
+    intervals = simulate_day(RefreshScheduler(checks_repository()))
+    assert len(intervals) < old_schedule_checks() / 2
+
+
+def test_unchanged_checks_back_off_in_busy_hours():
+    scheduler = RefreshScheduler(checks_repository(change_hours=range(9, 17)))
+    now = DAY + timedelta(hours=9)
+    scheduler.record_check(True, now)
+    intervals = []
+    for i in range(10):
+        due = scheduler.next_check_at(now)
+        intervals.append(due - now)
+        now = due
+        scheduler.record_check(False, now)
+    assert intervals[:3] == [2 * MINUTE, 4 * MINUTE, 5 * MINUTE]
+    assert set(intervals[3:]) == {5 * MINUTE}
+
+
+def test_hours_with_changes_are_checked_often():
+    # Changes on a third of the days, like working days with edits
+    checks = checks_repository(change_hours=range(9, 17))
+    intervals = simulate_day(RefreshScheduler(checks))
+    assert longest(intervals, range(9, 17)) == 5 * MINUTE
+    assert longest(intervals, range(7, 9)) > 5 * MINUTE
+    assert longest(intervals, range(0, 6)) >= timedelta(hours=1)
+    assert longest(intervals, range(19, 23)) >= timedelta(hours=1)
+
+
+def test_rare_changes_shorten_the_interval():
+    rare = simulate_day(
+        RefreshScheduler(checks_repository(change_hours=[20], change_every=14))
+    )
+    never = simulate_day(RefreshScheduler(checks_repository()))
+    assert longest(rare, [20]) < longest(never, [20]) / 2
+
+
+def test_checks_of_today_do_not_change_learned_hours():
+    # Only the ceiling is compared, so the back-off is made long first
+    checks = checks_repository(change_hours=[20], change_every=14)
+    early, late = RefreshScheduler(checks), RefreshScheduler(checks)
+    for scheduler in (early, late):
+        for i in range(10):
+            scheduler.record_check(False, DAY)
+    early.record_check(False, DAY + timedelta(hours=3))
+    late.record_check(False, DAY + timedelta(hours=20, minutes=1))
+    at = DAY + timedelta(hours=20, minutes=30)
+    assert early.interval(at) == late.interval(at) < timedelta(hours=3)
+
+
+def test_failures_back_off_without_history():
+    checks = TimetableChecksRepository(sqlite3.connect(":memory:"))
+    scheduler = RefreshScheduler(checks)
+    now = DAY + timedelta(hours=2)
+    for i in range(5):
+        scheduler.record_failure(now)
+    assert scheduler.next_check_at(now) - now >= timedelta(hours=1)
+    assert checks.get_checks_since(DAY - timedelta(days=1)) == []
+
+
+def test_failures_back_off_in_busy_hours():
+    checks = checks_repository(change_hours=range(9, 17))
+    scheduler = RefreshScheduler(checks)
+    now = DAY + timedelta(hours=10)
+    intervals = []
+    for i in range(20):
+        scheduler.record_failure(now)
+        intervals.append(scheduler.next_check_at(now) - now)
+    assert intervals[:3] == [4 * MINUTE, 8 * MINUTE, 16 * MINUTE]
+    assert intervals[-1] == timedelta(hours=3)
+    # A successful check starts over
+    scheduler.record_check(True, now)
+    assert scheduler.next_check_at(now) - now == 2 * MINUTE
+
+
+def test_change_seen_elsewhere_resets_backoff():
+    checks = TimetableChecksRepository(sqlite3.connect(":memory:"))
+    scheduler = RefreshScheduler(checks)
+    now = DAY + timedelta(hours=2)
+    for i in range(5):
+        scheduler.record_check(False, now)
+    scheduler.reset_backoff()
+    assert scheduler.next_check_at(now) - now == 2 * MINUTE
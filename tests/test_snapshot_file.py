@@ -0,0 +1,54 @@
+from domain.snapshot_file import MappedTimetableSnapshot, write_snapshot_file
+from domain.timetable_snapshot import load_workbook_snapshot
+import re
+
+
+def hit_fields(hits):
+    return [
+        (h.day_index, h.row_index, h.weekday, h.time, h.lessons, h.groups)
+        for h in hits
+    ]
+
+
+def test_mapped_indexes_match_built_ones(timetable_file, tmp_path):
+    snapshot = load_workbook_snapshot(timetable_file)
+    filename = str(tmp_path / "timetable.snap")
+    write_snapshot_file(snapshot, filename)
+    mapped = MappedTimetableSnapshot(filename)
+    lessons = "\n".join(
+        row.lessons or ""
+        for _, tt in snapshot
+        for day in tt.timetable
+        for row in day.timetable
+    )
+    # E.g. "Дисциплина номер 7 (лекция)"
+    digit = re.search(r"номер (\d) \(лекция", lessons).group(1)
+    for query in (
+        "Дисциплина 3",
+        "преподаватель",
+        f"лекция {digit}",
+        "нет такого",
+    ):
+        hits = snapshot.lesson_index.search(query)
+        assert bool(hits) == (query != "нет такого")
+        assert hit_fields(mapped.lesson_index.search(query)) == hit_fields(
+            hits
+        )
+    built, loaded = snapshot.room_occupancy, mapped.room_occupancy
+    assert loaded.rooms == built.rooms
+    for day_index in range(7):
+        assert loaded.weekday(day_index) == built.weekday(day_index)
+        assert loaded.slots(day_index) == built.slots(day_index)
+        for slot in range(built.slots(day_index)):
+            assert loaded.slot_time(day_index, slot) == built.slot_time(
+                day_index, slot
+            )
+            assert loaded.free_rooms(day_index, slot) == built.free_rooms(
+                day_index, slot
+            )
+
+
+def test_repeated_search_pages_are_the_same(service):
+    first = [m.text for m in service.search_lessons("Дисциплина")]
+    again = [m.text for m in service.search_lessons("дисциплина")]
+    assert first and first == again
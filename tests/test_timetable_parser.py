@@ -0,0 +1,37 @@
+from domain.group_index import GroupIndex
+from domain.timetable_parser import get_group_locations_from_worksheet
+from openpyxl import Workbook
+
+
+def locations(*headers):
+    ws = Workbook().active
+    for column, header in enumerate(headers, start=1):
+        ws.cell(2, column, header)
+    return list(get_group_locations_from_worksheet(ws, 0))
+
+
+def test_single_group_header():
+    found = locations(None, None, "01-114 (ПИ)")
+    assert [(x.name, x.column) for x in found] == [("01-114", 3)]
+
+
+def test_punctuated_header():
+    found = locations(None, None, "11-101, подгруппа 1")
+    assert [x.name for x in found] == ["11-101"]
+
+
+def test_multi_group_header():
+    found = locations(None, None, "11-101, 11-102; 11-103м")
+    assert [(x.name, x.column) for x in found] == [
+        ("11-101", 3),
+        ("11-102", 3),
+        ("11-103м", 3),
+    ]
+    index = GroupIndex(found)
+    for name in ("11-101", "11-102", "11 - 103М"):
+        assert index.get(name).column == 3
+
+
+def test_unusual_group_name():
+    found = locations(None, None, "ИБ-21, поток")
+    assert [x.name for x in found] == ["ИБ-21"]
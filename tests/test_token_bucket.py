@@ -0,0 +1,20 @@
+from services.token_bucket import TokenBucketLimiter
+from time import sleep
+
+
+def test_rejects_after_capacity():
+    limiter = TokenBucketLimiter(2, 10)
+    assert [limiter.acquire("a") for _ in range(4)] == [0, 0, 1, 2]
+    assert limiter.acquire("b") == 0
+    assert limiter.rejected == 2
+
+
+def test_limited_keys_counts_only_empty_buckets():
+    limiter = TokenBucketLimiter(1, 0.2)
+    for key in ("a", "b"):
+        limiter.acquire(key)
+    limiter.acquire("a")
+    assert limiter.limited_keys() == 2
+    # Refilled without new requests
+    sleep(0.3)
+    assert limiter.limited_keys() == 0
@@ -0,0 +1,13 @@
+from services.types import Message, pack_messages
+
+
+def test_oversized_message_is_split_at_lines():
+    lines = [f"строка {i}" for i in range(1000)]
+    packed = list(pack_messages([Message("\n".join(lines))], limit=500))
+    assert all(len(m.text) <= 500 for m in packed)
+    assert "\n".join(m.text for m in packed).splitlines() == lines
+
+
+def test_oversized_line_is_cut():
+    packed = list(pack_messages([Message("x" * 1200)], limit=500))
+    assert [len(m.text) for m in packed] == [500, 500, 200]